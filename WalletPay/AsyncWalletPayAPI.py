@@ -1,66 +1,208 @@
-from typing import Optional, Dict, List
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, AsyncIterator
+from urllib.parse import urlparse
 
 import aiohttp
 
+from WalletPay.OrderListStream import OrderItemsParser, AdaptivePageSizer
 from WalletPay.types import OrderPreview
 from WalletPay.types import OrderReconciliationItem
 from WalletPay.types import WalletPayException
 from WalletPay.types.Exception import CreateOrderException, GetOrderPreviewException, GetOrderListException, \
-    GetOrderAmountException
+    GetOrderAmountException, WalletHTTPStatusException, WalletConnectionException
 
 
 class AsyncWalletPayAPI:
     BASE_URL = "https://pay.wallet.tg/wpay/store-api/v1/"
+    STREAM_CHUNK_SIZE = 65536
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, pool_size: int = 10, warm_up_connections: int = 0, keep_alive: bool = False,
+                 keepalive_timeout: float = 300.0):
         """
         Initialize the API client.
 
+        By default every request opens its own session, as in earlier versions. Connections are kept alive in a
+        shared pool only if keep_alive is set, inside "async with api:" or after warm_up; the pool must then be
+        released with close(), which leaving the "async with" block does.
+
         :param api_key: The API key to access WalletPay.
+        :param pool_size: Maximum number of keep-alive connections kept open. Default is 10.
+        :param warm_up_connections: Number of connections to open in a background task right away, see warm_up.
+            Only used when the client is created inside a running event loop. Default is 0 (no warm-up).
+        :param keep_alive: Reuse connections across requests until close() is called. Default is False.
+        :param keepalive_timeout: Seconds an idle pooled connection is kept open, so warmed-up connections are still
+            there for the first request. The server may close them earlier. Default is 300.
         """
         self.api_key = api_key
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.keepalive_timeout = keepalive_timeout
+        self.warm_up_time: Optional[float] = None
+        self.warm_up_task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._context_depth = 0
+        if warm_up_connections:
+            try:
+                self.warm_up_task = asyncio.get_running_loop().create_task(self.warm_up(warm_up_connections))
+            except RuntimeError:
+                logging.info("No running event loop, call warm_up() to warm up connections")
+
+    async def __aenter__(self):
+        self._context_depth += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._context_depth -= 1
+        if not self._context_depth:
+            await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Internal method to get the shared session, creating it for the running event loop if needed. A session
+        left over from another event loop is closed first.
+
+        :return: aiohttp ClientSession with a keep-alive connection pool.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is not None and self._session_loop is not loop:
+            stale, stale_loop = self._session, self._session_loop
+            self._session = None
+            if not stale.closed:
+                if stale_loop.is_running():
+                    asyncio.run_coroutine_threadsafe(stale.close(), stale_loop)
+                else:
+                    await stale.close()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+
+    @asynccontextmanager
+    async def _request_session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """
+        Internal method to get the session for a request: the shared session if connections are kept alive,
+        otherwise a new session that is closed after the request.
+
+        :return: Async context manager yielding an aiohttp ClientSession.
+        """
+        if self.keep_alive or self._context_depth:
+            yield await self._get_session()
+        else:
+            async with aiohttp.ClientSession() as session:
+                yield session
+
+    async def close(self):
+        """
+        Close the shared session and its connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
-    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+    async def warm_up(self, n_connections: int = 1) -> float:
+        """
+        Open keep-alive connections ahead of the first request, so it does not pay for DNS resolution and TLS
+        handshakes. The connections resolve the API host through the connector, which caches the result. Enables
+        keep_alive, so call close() when the client is no longer needed.
+
+        :param n_connections: Number of connections to open, capped at pool_size.
+        :return: Time the warm-up took in seconds, also stored in warm_up_time.
+        """
+        start = time.monotonic()
+        url = urlparse(self.BASE_URL)
+
+        self.keep_alive = True
+        session = await self._get_session()
+
+        async def open_connection():
+            try:
+                async with session.head(f"{url.scheme}://{url.netloc}/",
+                                        timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.info(f"Warm-up connection to {url.netloc} failed: {e}")
+
+        n_connections = max(1, min(n_connections, self.pool_size))
+        await asyncio.gather(*(open_connection() for _ in range(n_connections)))
+
+        self.warm_up_time = time.monotonic() - start
+        logging.info(f"Warmed up {n_connections} connections in {self.warm_up_time:.3f}s")
+        return self.warm_up_time
+
+    def _headers(self) -> Dict:
+        """
+        Internal method to build the request headers.
+
+        :return: Headers with the API key.
+        """
+        return {
+            'Wpay-Store-Api-Key': self.api_key,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                            timeout: Optional[float] = None) -> Dict:
         """
         Internal method to perform API requests.
 
         :param method: HTTP method ("POST" or "GET").
         :param endpoint: API endpoint.
         :param data: Data to send in the request body (for POST requests).
+        :param timeout: Request timeout in seconds. Default is None (aiohttp's default).
         :return: Response from the API as a dictionary.
 
         Source: https://docs.wallet.tg/pay/#api
         """
-        headers = {
-            'Wpay-Store-Api-Key': self.api_key,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
+        headers = self._headers()
         url = self.BASE_URL + endpoint
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with self._request_session() as session:
+                kwargs = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
                 if method == "POST":
-                    async with session.post(url, headers=headers, json=data) as response:
-                        response_data = await response.json()
+                    request = session.post(url, headers=headers, json=data, **kwargs)
                 elif method == "GET":
-                    async with session.get(url, headers=headers) as response:
-                        response_data = await response.json()
+                    request = session.get(url, headers=headers, **kwargs)
                 else:
                     raise WalletPayException("Invalid HTTP method")
 
-                if response.status != 200:
-                    raise WalletPayException(response_data.get("message", "Unknown error"))
-
-                return response_data
+                async with request as response:
+                    if response.status != 200:
+                        raise await self._status_error(response)
+                    return await response.json()
 
         except aiohttp.ClientError as e:
-            raise WalletPayException(f"API request failed: {e}")
+            raise WalletConnectionException(f"API request failed: {e}")
+
+    @staticmethod
+    async def _status_error(response: aiohttp.ClientResponse) -> WalletHTTPStatusException:
+        """
+        Internal method to build the exception for a response with an HTTP status other than 200.
+
+        :param response: The API response.
+        :return: WalletHTTPStatusException with the status code and the error message of the response.
+        """
+        try:
+            response_data = await response.json(content_type=None)
+        except ValueError:
+            response_data = {}
+        if not isinstance(response_data, dict):
+            response_data = {}
+        return WalletHTTPStatusException(response.status, response_data,
+                                         response_data.get("message", "Unknown error"))
 
     async def create_order(self, amount: float, currency_code: str, description: str, external_id: str,
                            timeout_seconds: int, customer_telegram_user_id: str,
                            return_url: Optional[str] = None, fail_return_url: Optional[str] = None,
-                           custom_data: Optional[str] = None, auto_conversion_currency: Optional[str] = None) -> OrderPreview:
+                           custom_data: Optional[str] = None, auto_conversion_currency: Optional[str] = None,
+                           request_timeout: Optional[float] = None) -> OrderPreview:
         """
         Create a new order.
 
@@ -74,8 +216,10 @@ class AsyncWalletPayAPI:
         :param fail_return_url: URL for redirection after failed payment.
         :param custom_data: Additional order data.
         :param auto_conversion_currency: Currency code for automatic conversion (e.g., "TON", "BTC", "USDT")
+        :param request_timeout: Request timeout in seconds. Default is None.
 
-        :return: OrderPreview object with information about the created order.
+        :return: OrderPreview object with information about the created order, or about the existing order if an
+            order with the same external ID was already created.
 
         Source: https://docs.wallet.tg/pay/#create-order
         """
@@ -98,8 +242,9 @@ class AsyncWalletPayAPI:
         if auto_conversion_currency:
             data["autoConversionCurrency"] = auto_conversion_currency
 
-        response_data = await self._make_request("POST", "order", data)
-        if response_data.get("status") == "SUCCESS":
+        response_data = await self._make_request("POST", "order", data, timeout=request_timeout)
+        # ALREADY comes with the existing order when the external ID was used before, e.g. by a retried request.
+        if response_data.get("status") in ("SUCCESS", "ALREADY"):
             return OrderPreview(response_data.get("data"))
         raise CreateOrderException(response_data, "Failed to create order")
 
@@ -133,6 +278,71 @@ class AsyncWalletPayAPI:
             return [OrderReconciliationItem(order_data) for order_data in orders_data]
         raise GetOrderListException(response_data, "Failed to retrieve order list")
 
+    async def _stream_order_list(self, offset: int, count: int) -> AsyncIterator[bytes]:
+        """
+        Internal method to request an order list page and yield its body as it is received.
+
+        :param offset: Pagination offset.
+        :param count: Number of orders to return.
+        :return: Async iterator over the received chunks of the response body.
+        """
+        url = self.BASE_URL + f"reconciliation/order-list?offset={offset}&count={count}"
+        try:
+            async with self._request_session() as session, session.get(url, headers=self._headers()) as response:
+                if response.status != 200:
+                    raise await self._status_error(response)
+                async for chunk in response.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                    yield chunk
+        except aiohttp.ClientError as e:
+            raise WalletConnectionException(f"API request failed: {e}")
+
+    async def iter_order_list(self, offset: int = 0, page_size: Optional[int] = None,
+                              sizer: Optional[AdaptivePageSizer] = None) -> AsyncIterator[OrderReconciliationItem]:
+        """
+        Iterate over all orders, requesting pages until the list is exhausted.
+
+        Items are parsed incrementally and yielded as they arrive, without buffering whole pages. Unless page_size
+        is given, the page size adapts to the time spent waiting for the network and to the response size.
+
+        :param offset: Pagination offset to start from. Default is 0.
+        :param page_size: Fixed number of orders per page. Default is None (adaptive).
+        :param sizer: The AdaptivePageSizer to use when page_size is not given. Default is a new AdaptivePageSizer.
+        :return: Async iterator over OrderReconciliationItem objects.
+
+        Source: https://docs.wallet.tg/pay/#get-order-list
+        """
+        if page_size is None and sizer is None:
+            sizer = AdaptivePageSizer()
+        while True:
+            count = page_size or sizer.page_size
+            received = size = 0
+            latency = 0.0
+            parser = OrderItemsParser()
+            chunks = self._stream_order_list(offset, count)
+            try:
+                while True:
+                    start = time.monotonic()
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        latency += time.monotonic() - start
+                    size += len(chunk)
+                    for item in parser.feed(chunk):
+                        received += 1
+                        yield OrderReconciliationItem(item)
+            finally:
+                await chunks.aclose()
+            if parser.close() != "SUCCESS":
+                raise GetOrderListException({"status": parser.status, "message": parser.message},
+                                            "Failed to retrieve order list")
+            if sizer:
+                sizer.observe(received, latency, size)
+            if received < count:
+                return
+            offset += received
+
     async def get_order_amount(self) -> int:
         """
         Retrieve the total amount of all orders.
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+from typing import Dict, Iterator, List, Optional
+
+from WalletPay.WalletPayAPI import WalletPayAPI
+from WalletPay.types import OrderReconciliationItem
+from WalletPay.types import WalletPayException
+
+
+class OrderExporter:
+    """
+    Streams the order reconciliation list to NDJSON, CSV or Parquet files.
+
+    Orders are streamed from the reconciliation endpoint with WalletPayAPI.iter_order_list, flattened and written
+    to the output in chunks of chunk_size rows, so memory usage depends on the chunk size only and not on the total
+    number of orders.
+
+    Attributes:
+        client (WalletPayAPI): The API client used to fetch the order list.
+        page_size (int, optional): Number of orders requested per page, or None to adapt it to the API latency.
+        chunk_size (int): Number of rows written at a time.
+        FORMATS (tuple): Supported output formats.
+        COLUMNS (list): Column names of the flat output rows.
+    """
+
+    FORMATS = ("ndjson", "csv", "parquet")
+    COLUMNS = [
+        "id", "status", "external_id", "customer_telegram_user_id",
+        "created_date_time", "expiration_date_time", "payment_date_time",
+        "amount", "currency_code",
+        "payment_amount", "payment_currency_code",
+        "fee_amount", "fee_currency_code",
+        "net_amount", "net_currency_code",
+        "exchange_rate",
+    ]
+
+    def __init__(self, client: WalletPayAPI, page_size: Optional[int] = None, chunk_size: int = 1000):
+        """
+        Initialize the OrderExporter.
+
+        :param client: The API client used to fetch the order list.
+        :param page_size: Number of orders requested per page. Default is None (adaptive).
+        :param chunk_size: Number of rows written at a time. Default is 1000.
+        """
+        if page_size is not None and page_size <= 0:
+            raise WalletPayException("Page size must be positive")
+        if chunk_size <= 0:
+            raise WalletPayException("Chunk size must be positive")
+        self.client = client
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def flatten(order: OrderReconciliationItem) -> Dict:
+        """
+        Convert an order into a flat row with one column per amount, fee, net amount and exchange rate.
+
+        :param order: OrderReconciliationItem to convert.
+        :return: Dictionary keyed by OrderExporter.COLUMNS.
+        """
+        option = order.selected_payment_option
+        return {
+            "id": order.id,
+            "status": order.status,
+            "external_id": order.extrenal_id,
+            "customer_telegram_user_id": order.customer_telegram_user_id,
+            "created_date_time": order.created_date_time,
+            "expiration_date_time": order.expiration_date_time,
+            "payment_date_time": order.payment_date_time,
+            "amount": order.amount.amount,
+            "currency_code": order.amount.currencyCode,
+            "payment_amount": option.amount.amount if option else None,
+            "payment_currency_code": option.amount.currencyCode if option else None,
+            "fee_amount": option.amountFee.amount if option else None,
+            "fee_currency_code": option.amountFee.currencyCode if option else None,
+            "net_amount": option.amountNet.amount if option else None,
+            "net_currency_code": option.amountNet.currencyCode if option else None,
+            "exchange_rate": option.exchangeRate if option else None,
+        }
+
+    def iter_chunks(self, offset: int = 0) -> Iterator[List[Dict]]:
+        """
+        Stream the order list and yield flattened rows in chunks.
+
+        :param offset: Pagination offset to start from.
+        :return: Iterator over lists of at most chunk_size flat rows.
+        """
+        rows = []
+        for order in self.client.iter_order_list(offset=offset, page_size=self.page_size):
+            rows.append(self.flatten(order))
+            if len(rows) >= self.chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    def export(self, path: str, fmt: str = "ndjson", compress: bool = False, offset: int = 0) -> int:
+        """
+        Export all orders to a file. The output is written to a temporary file next to path and moved into place only
+        when the export completed, so a failed export never leaves a truncated file at path.
+
+        :param path: Output file path.
+        :param fmt: Output format, one of "ndjson", "csv" or "parquet". Default is "ndjson".
+        :param compress: Gzip the output. For Parquet the column chunks are gzip-compressed instead.
+        :param offset: Pagination offset to start from. Default is 0.
+        :return: Number of exported orders.
+        """
+        if fmt not in self.FORMATS:
+            raise WalletPayException(f"Unsupported export format: {fmt}")
+        if fmt == "parquet":
+            return self._export_parquet(path, compress, offset)
+
+        opener = gzip.open if compress else open
+        tmp_path = f"{path}.tmp"
+        total = 0
+        try:
+            with opener(tmp_path, "wt", encoding="utf-8", newline="") as file:
+                writer = None
+                if fmt == "csv":
+                    writer = csv.DictWriter(file, fieldnames=self.COLUMNS)
+                    writer.writeheader()
+                for rows in self.iter_chunks(offset):
+                    if writer:
+                        writer.writerows(rows)
+                    else:
+                        file.write("".join(json.dumps(row) + "\n" for row in rows))
+                    total += len(rows)
+                    logging.info(f"Exported {total} orders to {path}")
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        return total
+
+    def _export_parquet(self, path: str, compress: bool, offset: int) -> int:
+        """
+        Internal method to export orders to Parquet, writing one row group per chunk.
+
+        :param path: Output file path.
+        :param compress: Use gzip compression for column chunks, otherwise snappy.
+        :param offset: Pagination offset to start from.
+        :return: Number of exported orders.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise WalletPayException("Parquet export requires pyarrow. Install it with: pip install pyarrow")
+
+        schema = pa.schema([
+            (column, pa.int64() if column in ("id", "customer_telegram_user_id") else pa.string())
+            for column in self.COLUMNS
+        ])
+        tmp_path = f"{path}.tmp"
+        total = 0
+        try:
+            with pq.ParquetWriter(tmp_path, schema, compression="gzip" if compress else "snappy") as writer:
+                for rows in self.iter_chunks(offset):
+                    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                    total += len(rows)
+                    logging.info(f"Exported {total} orders to {path}")
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        return total
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command-line entry point for exporting orders.
+
+    :param argv: Command-line arguments. Defaults to sys.argv.
+    :return: Process exit code.
+    """
+    parser = argparse.ArgumentParser(prog="walletpay-export", description="Export WalletPay orders to a file.")
+    parser.add_argument("output", help="Output file path.")
+    parser.add_argument("--format", dest="fmt", choices=OrderExporter.FORMATS, default="ndjson")
+    parser.add_argument("--gzip", dest="compress", action="store_true", help="Compress the output with gzip.")
+    parser.add_argument("--page-size", type=int, default=None,
+                        help="Orders requested per page. Adapts to the API latency if omitted.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows written at a time.")
+    parser.add_argument("--offset", type=int, default=0, help="Pagination offset to start from.")
+    parser.add_argument("--api-key", default=os.environ.get("WALLETPAY_API_KEY"),
+                        help="Store API key. Defaults to the WALLETPAY_API_KEY environment variable.")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or WALLETPAY_API_KEY)")
+    if args.page_size is not None and args.page_size <= 0:
+        parser.error("--page-size must be positive")
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+
+    exporter = OrderExporter(WalletPayAPI(api_key=args.api_key), page_size=args.page_size,
+                             chunk_size=args.chunk_size)
+    try:
+        total = exporter.export(args.output, fmt=args.fmt, compress=args.compress, offset=args.offset)
+    except WalletPayException as e:
+        logging.error(f"Export failed: {e}")
+        return 1
+    logging.info(f"Export finished: {total} orders written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
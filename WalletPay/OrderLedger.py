@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Optional, Tuple, Union
+
+from WalletPay.types import Event
+from WalletPay.types import WalletPayException
+from WalletPay.utils import call_client
+
+
+class OrderLedger:
+    """
+    An in-process ledger of order totals, updated incrementally from webhook events.
+
+    Every ORDER_PAID and ORDER_FAILED event is added to running totals, so dashboards can read totals without
+    calling the API. Totals are kept per currency, per status and per time bucket. Each total holds the number of
+    orders, the order amount and the fee and net amounts of the selected payment option. Fee and net amounts are
+    booked under the currency they are paid in, which may differ from the order currency.
+
+    Currency and time bucket totals include paid orders only, status totals include paid and failed orders.
+    Amounts in different currencies are never added together.
+
+    get_order_amount returns a single integer amount in the store's currency, so reconciliation needs
+    reconcile_currency to be set to that currency and only compares the totals of that currency. The first
+    reconciliation records a baseline; every later one compares the API amount with the baseline plus the paid
+    amounts booked since then. Because the client truncates the API amount to an integer, a drift smaller than 1 is
+    expected and not a discrepancy.
+
+    Attributes:
+        bucket_seconds (int): Width of a time bucket in seconds.
+        max_buckets (int): Number of most recent time buckets to keep.
+        dedup_size (int): Number of most recent order IDs remembered to ignore redelivered and replayed events.
+        reconcile_currency (str, optional): Currency of the amount returned by get_order_amount.
+        reconciled_amount (Decimal, optional): Amount returned by the last reconciliation.
+        reconciled_at (datetime, optional): Time of the last reconciliation.
+        drift (Decimal, optional): Difference between the reconciled amount and the ledger estimate at that time,
+            None until the second reconciliation.
+    """
+
+    PAID_STATUS = "PAID"
+    FAILED_STATUS = "FAILED"
+
+    def __init__(self, bucket_seconds: int = 3600, max_buckets: int = 24 * 31, dedup_size: int = 10000,
+                 reconcile_currency: Optional[str] = None):
+        """
+        Initialize the OrderLedger.
+
+        :param bucket_seconds: Width of a time bucket in seconds. Default is one hour.
+        :param max_buckets: Number of most recent time buckets to keep. Default is 31 days of hourly buckets.
+        :param dedup_size: Number of most recent order IDs remembered for deduplication. Default is 10000.
+        :param reconcile_currency: Currency of the amount returned by get_order_amount, e.g. "USD". Default is None
+            (reconciliation disabled).
+        """
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max_buckets
+        self.dedup_size = dedup_size
+        self.reconcile_currency = reconcile_currency
+        self.reconciled_amount: Optional[Decimal] = None
+        self.reconciled_at: Optional[datetime] = None
+        self.drift: Optional[Decimal] = None
+
+        self._lock = threading.Lock()
+        self._by_currency: Dict[str, Dict[str, Decimal]] = {}
+        self._by_status: Dict[Tuple[str, str], Dict[str, Decimal]] = {}
+        self._by_bucket: "OrderedDict[Tuple[str, str], Dict[str, Decimal]]" = OrderedDict()
+        self._bucket_keys: "OrderedDict[str, None]" = OrderedDict()
+        self._seen_orders: "OrderedDict[int, None]" = OrderedDict()
+        self._amount_at_reconcile = Decimal(0)
+
+    @staticmethod
+    def _empty_totals() -> Dict[str, Decimal]:
+        return {"count": Decimal(0), "amount": Decimal(0), "fee": Decimal(0), "net": Decimal(0)}
+
+    def _bucket_start(self, moment: Union[str, datetime]) -> str:
+        """
+        Internal method to get the ISO-8601 start of the time bucket containing a moment.
+
+        :param moment: ISO-8601 date-time string or datetime.
+        :return: ISO-8601 start of the bucket in UTC.
+        """
+        if isinstance(moment, str):
+            moment = datetime.fromisoformat(moment.replace("Z", "+00:00"))
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        timestamp = int(moment.timestamp()) // self.bucket_seconds * self.bucket_seconds
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+    def _book(self, totals: Dict[str, Decimal], count: bool, amount: Decimal = Decimal(0),
+              fee: Decimal = Decimal(0), net: Decimal = Decimal(0)):
+        if count:
+            totals["count"] += 1
+        totals["amount"] += amount
+        totals["fee"] += fee
+        totals["net"] += net
+
+    def _totals_for(self, index: Dict, key) -> Dict[str, Decimal]:
+        totals = index.get(key)
+        if totals is None:
+            totals = index[key] = self._empty_totals()
+        return totals
+
+    def _add_bucket(self, bucket: str) -> bool:
+        """
+        Internal method to start tracking a time bucket, evicting the oldest buckets beyond max_buckets.
+
+        :param bucket: ISO-8601 start of the bucket in UTC. Bucket starts share one format, so they sort by time.
+        :return: False if the bucket is older than every retained bucket and would be evicted at once.
+        """
+        if bucket in self._bucket_keys:
+            return True
+        if self._bucket_keys and len(self._bucket_keys) >= self.max_buckets and bucket < min(self._bucket_keys):
+            return False
+        self._bucket_keys[bucket] = None
+        self._trim_buckets()
+        return bucket in self._bucket_keys
+
+    def _trim_buckets(self):
+        while len(self._bucket_keys) > self.max_buckets:
+            oldest = min(self._bucket_keys)
+            del self._bucket_keys[oldest]
+            for key in [key for key in self._by_bucket if key[0] == oldest]:
+                del self._by_bucket[key]
+
+    def apply(self, event: Event) -> bool:
+        """
+        Add an ORDER_PAID or ORDER_FAILED event to the running totals. Events are deduplicated by order ID, so a
+        webhook and a backfilled event of the same order are booked once.
+
+        :param event: The webhook event.
+        :return: True if the event was booked, False if it was a duplicate or of an unknown type.
+        """
+        if event.type not in ("ORDER_PAID", "ORDER_FAILED"):
+            return False
+
+        with self._lock:
+            payload = event.payload
+            if payload.order_id in self._seen_orders:
+                return False
+            self._seen_orders[payload.order_id] = None
+            if len(self._seen_orders) > self.dedup_size:
+                self._seen_orders.popitem(last=False)
+
+            currency = payload.order_amount.currencyCode
+            amount = Decimal(payload.order_amount.amount)
+
+            if event.type == "ORDER_FAILED":
+                status = payload.status or self.FAILED_STATUS
+                self._book(self._totals_for(self._by_status, (status, currency)), True, amount)
+                return True
+
+            bucket = self._bucket_start(payload.order_completed_datetime)
+            # Orders completed before the retained buckets are still added to the currency and status totals.
+            keep_bucket = self._add_bucket(bucket)
+
+            def paid_totals(code):
+                found = [self._totals_for(self._by_currency, code),
+                         self._totals_for(self._by_status, (self.PAID_STATUS, code))]
+                if keep_bucket:
+                    found.append(self._totals_for(self._by_bucket, (bucket, code)))
+                return found
+
+            for totals in paid_totals(currency):
+                self._book(totals, True, amount)
+            option = payload.selected_payment_option
+            if option:
+                fee = Decimal(option.amountFee.amount)
+                net = Decimal(option.amountNet.amount)
+                for totals in paid_totals(option.amountFee.currencyCode):
+                    self._book(totals, False, fee=fee)
+                for totals in paid_totals(option.amountNet.currencyCode):
+                    self._book(totals, False, net=net)
+            return True
+
+    def currency_totals(self, currency: str) -> Dict[str, Decimal]:
+        """
+        Get totals of paid orders in a currency.
+
+        :param currency: Currency code (e.g., "USD").
+        :return: Dictionary with "count", "amount", "fee" and "net" totals.
+        """
+        return dict(self._by_currency.get(currency) or self._empty_totals())
+
+    def status_totals(self, status: str, currency: str) -> Dict[str, Decimal]:
+        """
+        Get totals of orders with a status in a currency.
+
+        :param status: Order status, "PAID" for paid orders or the failed order status (e.g., "EXPIRED").
+        :param currency: Currency code (e.g., "USD").
+        :return: Dictionary with "count", "amount", "fee" and "net" totals.
+        """
+        return dict(self._by_status.get((status, currency)) or self._empty_totals())
+
+    def bucket_totals(self, moment: Union[str, datetime], currency: str) -> Dict[str, Decimal]:
+        """
+        Get totals of paid orders in a currency for the time bucket containing a moment.
+
+        :param moment: ISO-8601 date-time string or datetime inside the bucket.
+        :param currency: Currency code (e.g., "USD").
+        :return: Dictionary with "count", "amount", "fee" and "net" totals.
+        """
+        return dict(self._by_bucket.get((self._bucket_start(moment), currency)) or self._empty_totals())
+
+    def estimated_order_amount(self) -> Optional[Decimal]:
+        """
+        Estimate what get_order_amount would return, without calling the API.
+
+        The estimate is the amount returned by the last reconciliation plus the amounts of orders in
+        reconcile_currency paid since then.
+
+        :return: Estimated amount in reconcile_currency, or None before the first reconciliation.
+        """
+        if self.reconciled_amount is None:
+            return None
+        amount = self.currency_totals(self.reconcile_currency)["amount"]
+        return self.reconciled_amount + amount - self._amount_at_reconcile
+
+    async def reconcile(self, client) -> Optional[Decimal]:
+        """
+        Reconcile the ledger against get_order_amount.
+
+        :param client: WalletPayAPI or AsyncWalletPayAPI instance.
+        :return: Drift between the API amount and the ledger estimate, or None on the first reconciliation.
+        """
+        if self.reconcile_currency is None:
+            raise WalletPayException("Set reconcile_currency to the currency of get_order_amount to reconcile")
+        remote = Decimal(await call_client(client.get_order_amount))
+        with self._lock:
+            estimate = self.estimated_order_amount()
+            self.drift = None if estimate is None else remote - estimate
+            self.reconciled_amount = remote
+            self.reconciled_at = datetime.now(timezone.utc)
+            self._amount_at_reconcile = self.currency_totals(self.reconcile_currency)["amount"]
+        if self.drift is not None and abs(self.drift) >= 1:
+            logging.info(f"Ledger drift of {self.drift} {self.reconcile_currency} corrected by reconciliation")
+        return self.drift
+
+    async def run_reconciliation(self, client, interval: float = 300):
+        """
+        Reconcile the ledger periodically until cancelled.
+
+        :param client: WalletPayAPI or AsyncWalletPayAPI instance.
+        :param interval: Seconds between reconciliations. Default is 300.
+        """
+        while True:
+            try:
+                await self.reconcile(client)
+            except Exception as e:
+                logging.info(f"Ledger reconciliation failed: {e}")
+            await asyncio.sleep(interval)
+
+    def snapshot(self) -> Dict:
+        """
+        Get a JSON-serializable snapshot of the ledger state.
+
+        :return: Dictionary that can be passed to restore().
+        """
+
+        def dump(index):
+            return [[list(key) if isinstance(key, tuple) else key, {k: str(v) for k, v in totals.items()}]
+                    for key, totals in index.items()]
+
+        with self._lock:
+            return {
+                "bucket_seconds": self.bucket_seconds,
+                "by_currency": dump(self._by_currency),
+                "by_status": dump(self._by_status),
+                "by_bucket": dump(self._by_bucket),
+                "bucket_keys": list(self._bucket_keys),
+                "seen_orders": list(self._seen_orders),
+                "reconcile_currency": self.reconcile_currency,
+                "amount_at_reconcile": str(self._amount_at_reconcile),
+                "reconciled_amount": None if self.reconciled_amount is None else str(self.reconciled_amount),
+                "reconciled_at": None if self.reconciled_at is None else self.reconciled_at.isoformat(),
+                "drift": None if self.drift is None else str(self.drift),
+            }
+
+    def restore(self, data: Dict):
+        """
+        Replace the ledger state with a snapshot.
+
+        :param data: Dictionary returned by snapshot().
+        """
+
+        def load(items, keyed_by_tuple):
+            return [(tuple(key) if keyed_by_tuple else key, {k: Decimal(v) for k, v in totals.items()})
+                    for key, totals in items]
+
+        def optional_decimal(value):
+            return None if value is None else Decimal(value)
+
+        with self._lock:
+            self.bucket_seconds = data["bucket_seconds"]
+            self._by_currency = dict(load(data["by_currency"], False))
+            self._by_status = dict(load(data["by_status"], True))
+            self._by_bucket = OrderedDict(load(data["by_bucket"], True))
+            self._bucket_keys = OrderedDict((key, None) for key in data["bucket_keys"])
+            self._trim_buckets()
+            self._seen_orders = OrderedDict((key, None) for key in data["seen_orders"])
+            self.reconcile_currency = data["reconcile_currency"] or self.reconcile_currency
+            self._amount_at_reconcile = Decimal(data["amount_at_reconcile"])
+            self.reconciled_amount = optional_decimal(data["reconciled_amount"])
+            self.reconciled_at = datetime.fromisoformat(data["reconciled_at"]) if data["reconciled_at"] else None
+            self.drift = optional_decimal(data["drift"])
+
+    def save(self, path: str):
+        """
+        Atomically write a snapshot of the ledger to a JSON file.
+
+        :param path: File path.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "OrderLedger":
+        """
+        Create a ledger from a JSON snapshot file, or an empty ledger if the file does not exist.
+
+        :param path: File path written by save().
+        :param kwargs: Arguments passed to the OrderLedger constructor.
+        :return: OrderLedger instance.
+        """
+        ledger = cls(**kwargs)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                ledger.restore(json.load(file))
+        return ledger
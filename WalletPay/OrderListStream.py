@@ -0,0 +1,213 @@
+import codecs
+import json
+import re
+from typing import Dict, List, Optional
+
+from WalletPay.types import WalletPayException
+
+
+class OrderItemsParser:
+    """
+    Incremental parser for order list responses.
+
+    Response bytes are fed as they arrive off the socket, and every element of the data.items array is returned
+    as soon as it is complete, so the full body never has to be buffered. Only the item being received is kept in
+    memory. The top-level status and message fields are captured as well.
+
+    Outside the items array the body is scanned for structural characters. Inside it, each item is decoded once
+    with json.JSONDecoder.raw_decode straight from the received text; an item cut off at the end of a chunk is kept
+    and decoded again when the next chunk arrives.
+
+    Attributes:
+        status (str, optional): The top-level status field, e.g. "SUCCESS".
+        message (str, optional): The top-level message field.
+    """
+
+    _SPECIAL = re.compile(r'["\\{}\[\]:,]')
+    _SEPARATOR = re.compile(r'[\s,]*')
+    _JSON = json.JSONDecoder()
+
+    def __init__(self):
+        self.status: Optional[str] = None
+        self.message: Optional[str] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        # One [bracket, current key] entry per open object or array.
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._string_parts: Optional[List[str]] = None
+        self._in_items = False
+        self._pending = ""
+
+    def _at_items(self) -> bool:
+        stack = self._stack
+        return (len(stack) == 3 and stack[0] == ["{", "data"] and stack[1] == ["{", "items"]
+                and stack[2][0] == "[")
+
+    def _on_string(self, value: str):
+        if self._expect_key and self._stack and self._stack[-1][0] == "{":
+            self._stack[-1][1] = value
+        elif len(self._stack) == 1 and self._stack[0][1] == "status":
+            self.status = json.loads(f'"{value}"')
+        elif len(self._stack) == 1 and self._stack[0][1] == "message":
+            self.message = json.loads(f'"{value}"')
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """
+        Parse the next chunk of the response body.
+
+        :param chunk: Raw response bytes.
+        :return: List of item dictionaries completed by this chunk.
+        """
+        text = self._pending + self._decoder.decode(chunk)
+        self._pending = ""
+        items = []
+        index = 0
+        while index < len(text):
+            if self._in_items:
+                index = self._decode_items(text, index, items)
+            else:
+                index = self._scan(text, index)
+        return items
+
+    def _decode_items(self, text: str, index: int, items: List[Dict]) -> int:
+        """
+        Internal method to decode the items array from a position up to its end or the end of the text.
+
+        :return: Position after the closing bracket of the array, or the length of the text.
+        """
+        while True:
+            index = self._SEPARATOR.match(text, index).end()
+            if index == len(text):
+                return index
+            if text[index] == "]":
+                self._stack.pop()
+                self._in_items = False
+                return index + 1
+            if text[index] != "{":
+                raise WalletPayException("Malformed order list response")
+            try:
+                item, index = self._JSON.raw_decode(text, index)
+            except json.JSONDecodeError:
+                self._pending = text[index:]
+                return len(text)
+            items.append(item)
+
+    def _scan(self, text: str, index: int) -> int:
+        """
+        Internal method to scan the body outside the items array for structural characters.
+
+        :return: Position after the opening bracket of the items array, or the length of the text.
+        """
+        string_start = 0 if self._string_parts is not None else None
+        if self._escape:
+            self._escape = False
+            index += 1
+
+        while True:
+            match = self._SPECIAL.search(text, index)
+            if match is None:
+                break
+            position = match.start()
+            char = text[position]
+            index = position + 1
+
+            if self._in_string:
+                if char == "\\":
+                    if index < len(text):
+                        index += 1
+                    else:
+                        self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._string_parts.append(text[string_start:position])
+                    self._on_string("".join(self._string_parts))
+                    self._string_parts = string_start = None
+            elif char == '"':
+                self._in_string = True
+                self._string_parts = []
+                string_start = index
+            elif char in "{[":
+                self._stack.append([char, None])
+                self._expect_key = char == "{"
+                if self._at_items():
+                    self._in_items = True
+                    return index
+            elif char in "}]":
+                if not self._stack:
+                    raise WalletPayException("Malformed order list response")
+                self._stack.pop()
+                self._expect_key = False
+            elif char == ":":
+                self._expect_key = False
+            elif char == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1][0] == "{"
+
+        if string_start is not None:
+            self._string_parts.append(text[string_start:])
+        return len(text)
+
+    def close(self) -> Optional[str]:
+        """
+        Finish parsing and check that the response was complete.
+
+        :return: The top-level status field.
+        """
+        self._decoder.decode(b"", final=True)
+        if self._stack or self._in_string or self._pending:
+            raise WalletPayException("Incomplete order list response")
+        return self.status
+
+
+class AdaptivePageSizer:
+    """
+    Chooses the order list page size from observed latency and response size.
+
+    After every page the per-item latency and size are measured and the page size moves toward the number of items
+    that fits both target_latency and target_bytes, smoothed so a single slow page does not collapse it.
+
+    Attributes:
+        page_size (int): Page size to request next.
+        minimum (int): Smallest page size.
+        maximum (int): Largest page size.
+        target_latency (float): Target time spent waiting for the network per page, in seconds.
+        target_bytes (int): Target response size of a page, in bytes.
+        smoothing (float): Weight of the newest observation, between 0 and 1.
+    """
+
+    def __init__(self, initial: int = 100, minimum: int = 10, maximum: int = 10000, target_latency: float = 1.0,
+                 target_bytes: int = 2000000, smoothing: float = 0.5):
+        """
+        Initialize the AdaptivePageSizer.
+
+        :param initial: Page size of the first request. Default is 100.
+        :param minimum: Smallest page size. Default is 10.
+        :param maximum: Largest page size. Default is 10000.
+        :param target_latency: Target time spent waiting for the network per page, in seconds. Default is 1.
+        :param target_bytes: Target response size of a page, in bytes. Default is 2 MB.
+        :param smoothing: Weight of the newest observation, between 0 and 1. Default is 0.5.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self.smoothing = smoothing
+        self.page_size = max(minimum, min(maximum, initial))
+        self._estimate = float(self.page_size)
+
+    def observe(self, received: int, latency: float, size: int) -> int:
+        """
+        Update the page size from a fetched page.
+
+        :param received: Number of items in the page.
+        :param latency: Time spent waiting for the network while fetching the page, in seconds.
+        :param size: Response size in bytes.
+        :return: The new page size.
+        """
+        if received <= 0 or latency <= 0 or size <= 0:
+            return self.page_size
+        ideal = min(self.target_latency * received / latency, self.target_bytes * received / size)
+        self._estimate = (1 - self.smoothing) * self._estimate + self.smoothing * ideal
+        self.page_size = int(max(self.minimum, min(self.maximum, self._estimate)))
+        return self.page_size
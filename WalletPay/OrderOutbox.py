@@ -0,0 +1,290 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from WalletPay.types import OrderPreview
+from WalletPay.types import WalletPayException
+from WalletPay.types.Exception import WalletHTTPStatusException, WalletConnectionException
+from WalletPay.utils import call_client
+
+
+class OrderOutbox:
+    """
+    A durable write-behind queue for create_order.
+
+    Order specs are written to a SQLite database and submit() returns at once. A pool of workers drains the queue
+    with bounded concurrency, retrying failed requests with exponential backoff. The external ID is the
+    idempotency key: WalletPay does not create a second order for the same external ID, so retries are safe, and
+    submitting an external ID that is already queued or completed does not create another request.
+
+    Only transient failures are retried: connection errors, timeouts and responses with a status in
+    RETRY_STATUS_CODES or of 500 and above. Any other failure, e.g. a 4xx response to an invalid order, marks the
+    order as failed at once.
+
+    Pending orders are reloaded when the outbox is started again, so queued work survives a restart.
+
+    Attributes:
+        client (WalletPayAPI | AsyncWalletPayAPI): The API client used to create orders.
+        path (str): Path of the SQLite database.
+        concurrency (int): Number of workers creating orders at the same time.
+        max_attempts (int): Number of attempts before an order with transient failures is marked as failed.
+        backoff (float): Delay before the first retry in seconds, doubled for every further attempt.
+        max_backoff (float): Maximum delay between retries in seconds.
+        attempt_timeout (float, optional): Maximum duration of a create_order attempt in seconds.
+        on_success (callable, optional): Called with the OrderPreview of every created order.
+        on_failure (callable, optional): Called with the external ID and the last exception of every failed order.
+    """
+
+    PENDING = "PENDING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    RATE_WINDOW_SECONDS = 60
+    RETRY_STATUS_CODES = {408, 429}
+
+    def __init__(self, client, path: str = "walletpay_outbox.db", concurrency: int = 4, max_attempts: int = 5,
+                 backoff: float = 1.0, max_backoff: float = 60.0, on_success: Optional[Callable] = None,
+                 on_failure: Optional[Callable] = None, attempt_timeout: Optional[float] = 30.0):
+        """
+        Initialize the OrderOutbox and open its database.
+
+        :param client: The API client used to create orders.
+        :param path: Path of the SQLite database. Default is "walletpay_outbox.db".
+        :param concurrency: Number of workers creating orders at the same time. Default is 4.
+        :param max_attempts: Number of attempts before an order with transient failures is marked as failed.
+            Default is 5.
+        :param backoff: Delay before the first retry in seconds. Default is 1.
+        :param max_backoff: Maximum delay between retries in seconds. Default is 60.
+        :param on_success: Function or coroutine function called with the OrderPreview of every created order.
+        :param on_failure: Function or coroutine function called with the external ID and the exception of every
+            order that failed. Futures of failed orders do not need to be awaited when it is set.
+        :param attempt_timeout: Maximum duration of a create_order attempt in seconds, after which it counts as a
+            transient failure, or None for no limit. Default is 30.
+        """
+        self.client = client
+        self.path = path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.attempt_timeout = attempt_timeout
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "external_id TEXT PRIMARY KEY, spec TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, "
+            "next_attempt_at REAL NOT NULL, created_at REAL NOT NULL, result TEXT, error TEXT)")
+        self._db.commit()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._pending: "OrderedDict[str, float]" = OrderedDict(
+            self._db.execute(
+                "SELECT external_id, created_at FROM outbox WHERE status = ? ORDER BY created_at",
+                (self.PENDING,)).fetchall())
+        self._completed = deque()
+
+    async def start(self):
+        """
+        Start the workers and enqueue the orders left pending by a previous run.
+        """
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        now = time.time()
+        for external_id, next_attempt_at in self._db.execute(
+                "SELECT external_id, next_attempt_at FROM outbox WHERE status = ? ORDER BY created_at",
+                (self.PENDING,)).fetchall():
+            self._schedule(external_id, max(0.0, next_attempt_at - now))
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logging.info(f"Order outbox started with {len(self._pending)} pending orders")
+
+    async def stop(self):
+        """
+        Stop the workers. Orders that are still pending stay in the database and are retried on the next start.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._db.close()
+
+    def submit(self, amount, currency_code: str, description: str, external_id: str, timeout_seconds: int,
+               customer_telegram_user_id: str, **kwargs) -> asyncio.Future:
+        """
+        Queue an order for creation. Takes the same arguments as create_order.
+
+        The order is committed to the database before submit returns, so it is called on the event loop and blocks
+        it for one SQLite transaction: about 0.15 ms on a local SSD, but an fsync can take several milliseconds on
+        slow or network disks. Keep the database on local storage when submitting from latency-sensitive handlers.
+
+        :return: Future resolved with the OrderPreview of the created order, or with the exception of the last
+            attempt if the order could not be created.
+        """
+        spec = dict(amount=amount, currency_code=currency_code, description=description, external_id=external_id,
+                    timeout_seconds=timeout_seconds, customer_telegram_user_id=customer_telegram_user_id, **kwargs)
+        future = self._futures.get(external_id)
+        if future is not None:
+            return future
+        future = asyncio.get_running_loop().create_future()
+
+        now = time.time()
+        inserted = self._db.execute(
+            "INSERT OR IGNORE INTO outbox (external_id, spec, status, attempts, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, 0, ?, ?)",
+            (external_id, json.dumps(spec, default=str), self.PENDING, now, now)).rowcount
+        self._db.commit()
+
+        if not inserted:
+            status, result, error = self._db.execute(
+                "SELECT status, result, error FROM outbox WHERE external_id = ?", (external_id,)).fetchone()
+            if status == self.DONE:
+                future.set_result(OrderPreview(json.loads(result)))
+                return future
+            if status == self.FAILED:
+                self._fail_future(future, WalletPayException(error))
+                return future
+
+        self._futures[external_id] = future
+        if inserted:
+            self._pending[external_id] = now
+            if self._queue is not None:
+                self._queue.put_nowait(external_id)
+        return future
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Get queue metrics.
+
+        :return: Dictionary with "depth" (number of pending orders), "oldest_age" (age of the oldest pending order
+            in seconds) and "drain_rate" (completed orders per second over the last minute).
+        """
+        now = time.time()
+        while self._completed and self._completed[0] < now - self.RATE_WINDOW_SECONDS:
+            self._completed.popleft()
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            "depth": len(self._pending),
+            "oldest_age": now - oldest if oldest is not None else 0.0,
+            "drain_rate": len(self._completed) / self.RATE_WINDOW_SECONDS,
+        }
+
+    def _schedule(self, external_id: str, delay: float):
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, external_id)
+        else:
+            self._queue.put_nowait(external_id)
+
+    async def _worker(self):
+        """
+        Internal method that takes orders from the queue and creates them until cancelled.
+        """
+        while True:
+            external_id = await self._queue.get()
+            try:
+                await self._process(external_id)
+            except Exception as e:
+                logging.info(f"Order outbox failed to process {external_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, external_id: str):
+        """
+        Internal method to make one create_order attempt and record its outcome.
+        """
+        row = self._db.execute("SELECT spec, status, attempts FROM outbox WHERE external_id = ?",
+                               (external_id,)).fetchone()
+        if row is None or row[1] != self.PENDING:
+            return
+        spec, attempts = json.loads(row[0]), row[2] + 1
+
+        try:
+            # The request timeout also ends the worker thread of a sync client, which wait_for cannot cancel.
+            preview = await asyncio.wait_for(
+                call_client(self.client.create_order, **spec, request_timeout=self.attempt_timeout),
+                self.attempt_timeout)
+        except Exception as e:
+            if attempts < self.max_attempts and self._is_transient(e):
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                self._db.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt_at = ?, error = ? WHERE external_id = ?",
+                    (attempts, time.time() + delay, str(e), external_id))
+                self._db.commit()
+                logging.info(f"Order {external_id} attempt {attempts} failed, retrying in {delay}s: {e}")
+                self._schedule(external_id, delay)
+                return
+            self._db.execute("UPDATE outbox SET status = ?, attempts = ?, error = ? WHERE external_id = ?",
+                             (self.FAILED, attempts, str(e), external_id))
+            self._db.commit()
+            self._finish(external_id)
+            logging.info(f"Order {external_id} failed after {attempts} attempts: {e}")
+            future = self._futures.pop(external_id, None)
+            if future is not None and not future.done():
+                self._fail_future(future, e)
+            if self.on_failure:
+                await self._notify(self.on_failure, external_id, e)
+            return
+
+        self._db.execute("UPDATE outbox SET status = ?, attempts = ?, result = ?, error = NULL WHERE external_id = ?",
+                         (self.DONE, attempts, json.dumps(self._preview_data(preview), default=str), external_id))
+        self._db.commit()
+        self._finish(external_id)
+        future = self._futures.pop(external_id, None)
+        if future is not None and not future.done():
+            future.set_result(preview)
+        if self.on_success:
+            await self._notify(self.on_success, preview)
+
+    def _is_transient(self, error: Exception) -> bool:
+        """
+        Internal method to check whether a failed create_order attempt may succeed when retried.
+
+        :param error: The exception raised by create_order.
+        :return: True for connection errors, timeouts and retryable HTTP statuses.
+        """
+        if isinstance(error, WalletHTTPStatusException):
+            return error.status_code >= 500 or error.status_code in self.RETRY_STATUS_CODES
+        return isinstance(error, (WalletConnectionException, asyncio.TimeoutError, OSError))
+
+    def _fail_future(self, future: asyncio.Future, error: Exception):
+        future.set_exception(error)
+        if self.on_failure:
+            # The failure is reported to on_failure, so a future nobody awaits must not log it as never retrieved.
+            future.exception()
+
+    def _finish(self, external_id: str):
+        self._pending.pop(external_id, None)
+        self._completed.append(time.time())
+
+    @staticmethod
+    async def _notify(callback: Callable, *args):
+        result = callback(*args)
+        if asyncio.iscoroutine(result):
+            await result
+
+    @staticmethod
+    def _preview_data(preview: OrderPreview) -> Dict:
+        return {
+            "id": preview.id,
+            "status": preview.status,
+            "number": preview.number,
+            "amount": {"currencyCode": preview.amount.currencyCode, "amount": preview.amount.amount},
+            "autoConversionCurrency": preview.auto_conversion_currency,
+            "createdDateTime": preview.created_date_time,
+            "expirationDateTime": preview.expiration_date_time,
+            "completedDateTime": preview.completed_date_time,
+            "payLink": preview.pay_link,
+            "directPayLink": preview.direct_pay_link,
+        }
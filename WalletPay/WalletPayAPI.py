@@ -1,63 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Optional, Dict, List
+import logging
+import threading
+import time
+from typing import Optional, Dict, List, Iterator
+from WalletPay.OrderListStream import OrderItemsParser, AdaptivePageSizer
 from WalletPay.types import WalletPayException
+from WalletPay.types.Exception import WalletHTTPStatusException, WalletConnectionException
 from WalletPay.types import OrderPreview
 from WalletPay.types import OrderReconciliationItem
 
 
 class WalletPayAPI:
     BASE_URL = "https://pay.wallet.tg/wpay/store-api/v1/"
+    STREAM_CHUNK_SIZE = 65536
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, pool_size: int = 10, warm_up_connections: int = 0):
         """
         Initialize the API client.
 
         :param api_key: The API key to access WalletPay.
+        :param pool_size: Maximum number of keep-alive connections kept open. Default is 10.
+        :param warm_up_connections: Number of connections to open in a background thread right away, see warm_up.
+            Default is 0 (no warm-up).
         """
         self.api_key = api_key
+        self.pool_size = pool_size
+        self.warm_up_time: Optional[float] = None
+        self.warm_up_thread: Optional[threading.Thread] = None
+        self.session = requests.Session()
+        self.session.mount(f"{urlparse(self.BASE_URL).scheme}://",
+                           HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        if warm_up_connections:
+            self.warm_up_thread = threading.Thread(target=self.warm_up, args=(warm_up_connections,), daemon=True)
+            self.warm_up_thread.start()
 
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+    def warm_up(self, n_connections: int = 1) -> float:
+        """
+        Open keep-alive connections ahead of the first request, so it does not pay for DNS resolution and TLS
+        handshakes.
+
+        :param n_connections: Number of connections to open, capped at pool_size.
+        :return: Time the warm-up took in seconds, also stored in warm_up_time.
+        """
+        start = time.monotonic()
+        url = urlparse(self.BASE_URL)
+
+        def open_connection(_):
+            try:
+                self.session.head(f"{url.scheme}://{url.netloc}/", timeout=10)
+            except requests.RequestException as e:
+                logging.info(f"Warm-up connection to {url.netloc} failed: {e}")
+
+        n_connections = max(1, min(n_connections, self.pool_size))
+        with ThreadPoolExecutor(max_workers=n_connections) as pool:
+            list(pool.map(open_connection, range(n_connections)))
+
+        self.warm_up_time = time.monotonic() - start
+        logging.info(f"Warmed up {n_connections} connections in {self.warm_up_time:.3f}s")
+        return self.warm_up_time
+
+    def _headers(self) -> Dict:
+        """
+        Internal method to build the request headers.
+
+        :return: Headers with the API key.
+        """
+        return {
+            'Wpay-Store-Api-Key': self.api_key,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                      timeout: Optional[float] = None) -> Dict:
         """
         Internal method to perform API requests.
 
         :param method: HTTP method ("POST" or "GET").
         :param endpoint: API endpoint.
         :param data: Data to send in the request body (for POST requests).
+        :param timeout: Request timeout in seconds. Default is None (no timeout).
         :return: Response from the API as a dictionary.
 
         Source: https://docs.wallet.tg/pay/#api
         """
-        headers = {
-            'Wpay-Store-Api-Key': self.api_key,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
+        headers = self._headers()
         url = self.BASE_URL + endpoint
 
         try:
             if method == "POST":
-                response = requests.post(url, headers=headers, data=json.dumps(data))
+                response = self.session.post(url, headers=headers, data=json.dumps(data), timeout=timeout)
             elif method == "GET":
-                response = requests.get(url, headers=headers)
+                response = self.session.get(url, headers=headers, timeout=timeout)
             else:
                 raise WalletPayException("Invalid HTTP method")
 
-            response_data = response.json()
-
             if response.status_code != 200:
-                raise WalletPayException(response_data.get("message", "Unknown error"))
+                raise self._status_error(response)
 
-            return response_data
+            return response.json()
 
         except requests.RequestException as e:
-            raise WalletPayException(f"API request failed: {e}")
+            raise WalletConnectionException(f"API request failed: {e}")
+
+    @staticmethod
+    def _status_error(response: requests.Response) -> WalletHTTPStatusException:
+        """
+        Internal method to build the exception for a response with an HTTP status other than 200.
+
+        :param response: The API response.
+        :return: WalletHTTPStatusException with the status code and the error message of the response.
+        """
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {}
+        if not isinstance(response_data, dict):
+            response_data = {}
+        return WalletHTTPStatusException(response.status_code, response_data,
+                                         response_data.get("message", "Unknown error"))
 
     def create_order(self, amount: Decimal, currency_code: str, description: str, external_id: str,
                      timeout_seconds: int, customer_telegram_user_id: str,
                      return_url: Optional[str] = None, fail_return_url: Optional[str] = None,
-                     custom_data: Optional[str] = None, auto_conversion_currency: Optional[str] = None) -> OrderPreview:
+                     custom_data: Optional[str] = None, auto_conversion_currency: Optional[str] = None,
+                     request_timeout: Optional[float] = None) -> OrderPreview:
         """
         Create a new order.
 
@@ -71,8 +143,10 @@ class WalletPayAPI:
         :param fail_return_url: URL for redirection after failed payment.
         :param custom_data: Additional order data.
         :param auto_conversion_currency: Currency code for automatic conversion (e.g., "TON", "BTC", "USDT")
+        :param request_timeout: Request timeout in seconds. Default is None.
 
-        :return: OrderPreview object with information about the created order.
+        :return: OrderPreview object with information about the created order, or about the existing order if an
+            order with the same external ID was already created.
 
         Source: https://docs.wallet.tg/pay/#create-order
         """
@@ -95,8 +169,9 @@ class WalletPayAPI:
         if auto_conversion_currency:
             data["autoConversionCurrency"] = auto_conversion_currency
 
-        response_data = self._make_request("POST", "order", data)
-        if response_data.get("status") == "SUCCESS":
+        response_data = self._make_request("POST", "order", data, timeout=request_timeout)
+        # ALREADY comes with the existing order when the external ID was used before, e.g. by a retried request.
+        if response_data.get("status") in ("SUCCESS", "ALREADY"):
             return OrderPreview(response_data.get("data"))
         raise WalletPayException("Failed to create order")
 
@@ -130,6 +205,67 @@ class WalletPayAPI:
             return [OrderReconciliationItem(order_data) for order_data in orders_data]
         raise WalletPayException("Failed to retrieve order list")
 
+    def _stream_order_list(self, offset: int, count: int) -> Iterator[bytes]:
+        """
+        Internal method to request an order list page and yield its body as it is received.
+
+        :param offset: Pagination offset.
+        :param count: Number of orders to return.
+        :return: Iterator over the received chunks of the response body.
+        """
+        url = self.BASE_URL + f"reconciliation/order-list?offset={offset}&count={count}"
+        try:
+            with self.session.get(url, headers=self._headers(), stream=True) as response:
+                if response.status_code != 200:
+                    raise self._status_error(response)
+                yield from response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+        except requests.RequestException as e:
+            raise WalletConnectionException(f"API request failed: {e}")
+
+    def iter_order_list(self, offset: int = 0, page_size: Optional[int] = None,
+                        sizer: Optional[AdaptivePageSizer] = None) -> Iterator[OrderReconciliationItem]:
+        """
+        Iterate over all orders, requesting pages until the list is exhausted.
+
+        Items are parsed incrementally and yielded as they arrive, without buffering whole pages. Unless page_size
+        is given, the page size adapts to the time spent waiting for the network and to the response size.
+
+        :param offset: Pagination offset to start from. Default is 0.
+        :param page_size: Fixed number of orders per page. Default is None (adaptive).
+        :param sizer: The AdaptivePageSizer to use when page_size is not given. Default is a new AdaptivePageSizer.
+        :return: Iterator over OrderReconciliationItem objects.
+
+        Source: https://docs.wallet.tg/pay/#get-order-list
+        """
+        if page_size is None and sizer is None:
+            sizer = AdaptivePageSizer()
+        while True:
+            count = page_size or sizer.page_size
+            received = size = 0
+            latency = 0.0
+            parser = OrderItemsParser()
+            chunks = self._stream_order_list(offset, count)
+            try:
+                while True:
+                    start = time.monotonic()
+                    chunk = next(chunks, None)
+                    latency += time.monotonic() - start
+                    if chunk is None:
+                        break
+                    size += len(chunk)
+                    for item in parser.feed(chunk):
+                        received += 1
+                        yield OrderReconciliationItem(item)
+            finally:
+                chunks.close()
+            if parser.close() != "SUCCESS":
+                raise WalletPayException("Failed to retrieve order list")
+            if sizer:
+                sizer.observe(received, latency, size)
+            if received < count:
+                return
+            offset += received
+
     def get_order_amount(self) -> int:
         """
         Retrieve the total amount of all orders.
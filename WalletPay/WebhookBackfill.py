@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from WalletPay.types import Event, OrderReconciliationItem
+from WalletPay.types.WebhookData import MoneyAmount
+from WalletPay.utils import call_client
+
+
+class WebhookBackfill:
+    """
+    Replays webhook events that were missed while the WebhookManager was not running.
+
+    The reconciliation order list is scanned from a stored checkpoint. Every order that reached PAID or a failed
+    status without a processed event gets an equivalent Event, which is sent through the callbacks registered on
+    the WebhookManager. Orders are deduplicated by order ID against both live and replayed events.
+
+    The checkpoint is the offset of the oldest order that was still active during the last scan, so every scan
+    only covers orders that could have changed since. Delivery is at-least-once: events processed after the last
+    checkpoint save may be replayed after a crash. Without a checkpoint file the first scan replays nothing and
+    only marks completed orders as processed, so enabling the backfill does not resend the store's whole history.
+
+    Attributes:
+        manager (WebhookManager): The manager whose callbacks receive the replayed events.
+        client (WalletPayAPI | AsyncWalletPayAPI): The API client used to scan the order list.
+        checkpoint_path (str): Path of the JSON checkpoint file.
+        page_size (int): Number of orders requested per page.
+        concurrency (int): Maximum number of orders replayed at the same time.
+        offset (int): Offset the next scan starts from.
+        FAILED_STATUSES (tuple): Order statuses reported with ORDER_FAILED events.
+    """
+
+    FAILED_STATUSES = ("EXPIRED", "CANCELLED")
+
+    def __init__(self, manager, checkpoint_path: str = "walletpay_backfill.json", page_size: int = 100,
+                 concurrency: int = 5):
+        """
+        Initialize the WebhookBackfill and load its checkpoint.
+
+        :param manager: The WebhookManager whose callbacks receive the replayed events.
+        :param checkpoint_path: Path of the JSON checkpoint file. Default is "walletpay_backfill.json".
+        :param page_size: Number of orders requested per page. Default is 100.
+        :param concurrency: Maximum number of orders replayed at the same time. Default is 5.
+        """
+        self.manager = manager
+        self.client = manager.client
+        self.checkpoint_path = checkpoint_path
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.offset = 0
+        self._bootstrap = not os.path.exists(checkpoint_path)
+        self.load_checkpoint()
+
+    def load_checkpoint(self):
+        """
+        Load the scan offset and the processed order IDs from the checkpoint file, if it exists.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        self.offset = checkpoint["offset"]
+        for order_id in checkpoint["processed_orders"]:
+            self.manager.mark_processed(order_id)
+
+    def save_checkpoint(self):
+        """
+        Atomically write the scan offset and the processed order IDs to the checkpoint file.
+        """
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"offset": self.offset, "processed_orders": list(self.manager.processed_orders)}, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    @staticmethod
+    def _money(amount: MoneyAmount) -> Dict:
+        return {"currencyCode": amount.currencyCode, "amount": amount.amount}
+
+    async def build_event(self, order: OrderReconciliationItem) -> Event:
+        """
+        Build the Event WalletPay would have sent for a completed order.
+
+        The order number and completion time are not part of the order list, so they are fetched with
+        get_order_preview.
+
+        :param order: A PAID, EXPIRED or CANCELLED order from the order list.
+        :return: Event with an event ID of the form "backfill-<order id>".
+        """
+        preview = await call_client(self.client.get_order_preview, order.id)
+        payload = {
+            "id": order.id,
+            "number": preview.number,
+            "externalId": order.extrenal_id,
+            "orderAmount": self._money(order.amount),
+            "orderCompletedDateTime": order.payment_date_time or preview.completed_date_time
+                                      or order.expiration_date_time,
+        }
+        option = order.selected_payment_option
+        if order.status == "PAID" and option:
+            payload["selectedPaymentOption"] = {
+                "amount": self._money(option.amount),
+                "amountFee": self._money(option.amountFee),
+                "amountNet": self._money(option.amountNet),
+                "exchangeRate": option.exchangeRate,
+            }
+        if order.status != "PAID":
+            payload["status"] = order.status
+        return Event({
+            "eventId": f"backfill-{order.id}",
+            "eventDateTime": datetime.now(timezone.utc).isoformat(),
+            "type": "ORDER_PAID" if order.status == "PAID" else "ORDER_FAILED",
+            "payload": payload,
+        })
+
+    async def _replay(self, order: OrderReconciliationItem, semaphore: asyncio.Semaphore) -> bool:
+        """
+        Internal method to replay a single order.
+
+        :return: True if the order's callbacks completed, False if building or dispatching the event failed.
+        """
+        async with semaphore:
+            try:
+                event = await self.build_event(order)
+                await self.manager.dispatch(event)
+            except Exception as e:
+                logging.info(f"Backfill of order {order.id} failed: {e}")
+                return False
+        logging.info(f"Backfilled {event.type} event for order {order.id}")
+        return True
+
+    async def run(self) -> int:
+        """
+        Scan the order list from the checkpoint and replay missed events.
+
+        :return: Number of replayed events.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        offset = self.offset
+        low_water: Optional[int] = None
+        replayed = 0
+
+        while True:
+            orders: List[OrderReconciliationItem] = await call_client(
+                self.client.get_order_list, offset=offset, count=self.page_size)
+            pending: List[Tuple[int, OrderReconciliationItem]] = []
+            for index, order in enumerate(orders, start=offset):
+                if order.status == "ACTIVE":
+                    low_water = index if low_water is None else low_water
+                elif (order.status == "PAID" or order.status in self.FAILED_STATUSES) \
+                        and not self.manager.is_processed(order.id):
+                    pending.append((index, order))
+
+            if self._bootstrap:
+                for _, order in pending:
+                    self.manager.mark_processed(order.id)
+                pending = []
+
+            results = await asyncio.gather(*(self._replay(order, semaphore) for _, order in pending))
+            for (index, _), replayed_ok in zip(pending, results):
+                if replayed_ok:
+                    replayed += 1
+                elif low_water is None or index < low_water:
+                    low_water = index
+
+            offset += len(orders)
+            if len(orders) < self.page_size:
+                break
+
+        self.offset = offset if low_water is None else low_water
+        self._bootstrap = False
+        self.save_checkpoint()
+        if replayed:
+            logging.info(f"Backfill replayed {replayed} missed events")
+        return replayed
+
+    async def run_periodically(self, interval: float = 60):
+        """
+        Run the backfill immediately and then every interval seconds until cancelled.
+
+        :param interval: Seconds between scans. Default is 60.
+        """
+        try:
+            while True:
+                try:
+                    await self.run()
+                except Exception as e:
+                    logging.info(f"Backfill scan failed: {e}")
+                await asyncio.sleep(interval)
+        finally:
+            self.save_checkpoint()
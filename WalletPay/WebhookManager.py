@@ -1,10 +1,16 @@
 from fastapi import FastAPI, Request, HTTPException
 from .types import Event
-from typing import Union
+from .types import WalletPayException
+from typing import Union, Optional
 from . import WalletPayAPI, AsyncWalletPayAPI
+from .OrderLedger import OrderLedger
+from .WebhookProfiler import WebhookProfiler
+from collections import OrderedDict
+import asyncio
 import logging
 import hmac
 import base64
+import json
 
 
 logging.basicConfig(level=logging.INFO)
@@ -21,26 +27,60 @@ class WebhookManager:
         port (int): The port to run the FastAPI server on.
         webhook_endpoint (str): The endpoint to listen for incoming webhooks.
         app (FastAPI): The FastAPI application instance.
+        ledger (OrderLedger, optional): A ledger updated from every processed event.
+        backfill (WebhookBackfill, optional): Replays events missed while the server was down, see enable_backfill.
+        processed_orders (OrderedDict): IDs of the most recent orders whose events were processed.
+        profiler (WebhookProfiler): Timings of webhook processing stages and callbacks, and event loop lag.
+        run_sync_callbacks_in_executor (bool): Whether sync callbacks run in a thread pool instead of on the loop.
+        debug_endpoint (str, optional): The endpoint serving profiler statistics.
+        debug_token (str, optional): The bearer token required to read the debug endpoint.
         ALLOWED_IPS (set): A set of IP addresses allowed to send webhooks.
+        MAX_PROCESSED_ORDERS (int): Number of processed order IDs remembered for deduplication.
     """
 
     ALLOWED_IPS = {"172.255.248.29", "172.255.248.12", "127.0.0.1"}
+    MAX_PROCESSED_ORDERS = 100000
 
     def __init__(self, client: Union[WalletPayAPI, AsyncWalletPayAPI], host: str = "0.0.0.0", port: int = 9123,
-                 webhook_endpoint: str = "/wp_webhook"):
+                 webhook_endpoint: str = "/wp_webhook", ledger: Optional[OrderLedger] = None,
+                 reconcile_interval: Optional[float] = 300, profiler: Optional[WebhookProfiler] = None,
+                 run_sync_callbacks_in_executor: bool = False, debug_endpoint: Optional[str] = None,
+                 debug_token: Optional[str] = None):
         """
         Initialize the WebhookManager.
 
-        :param client:
+        :param client: The API client, used to reconcile the ledger.
         :param host: The host to run the FastAPI server on. Default is "0.0.0.0".
         :param port: The port to run the FastAPI server on. Default is 9123.
         :param webhook_endpoint: The endpoint to listen for incoming webhooks. Default is "/wp_webhook".
+        :param ledger: A ledger to update from incoming events. Default is None.
+        :param reconcile_interval: Seconds between ledger reconciliations against get_order_amount while the server
+            is running, or None to disable them. Only used if the ledger has a reconcile_currency. Default is 300.
+        :param profiler: The profiler collecting stage timings. Default is a WebhookProfiler with default settings.
+        :param run_sync_callbacks_in_executor: Run sync callbacks in a thread pool so they do not block the event
+            loop. Default is False.
+        :param debug_endpoint: The endpoint serving profiler statistics, e.g. "/wp_debug". Default is None (disabled).
+        :param debug_token: The token clients must send as "Authorization: Bearer <token>" to read the debug
+            endpoint. Required if debug_endpoint is set, because the client IP cannot be trusted behind a proxy.
         """
+        if debug_endpoint and not debug_token:
+            raise WalletPayException("debug_endpoint requires a debug_token")
         self.successful_callbacks = []
         self.failed_callbacks = []
         self.host = host
         self.port = port
+        self.client = client
         self.api_key = client.api_key
+        self.ledger = ledger
+        self.reconcile_interval = reconcile_interval
+        self.backfill = None
+        self.backfill_interval = None
+        self.processed_orders = OrderedDict()
+        self._in_flight = {}
+        self.profiler = profiler or WebhookProfiler()
+        self.run_sync_callbacks_in_executor = run_sync_callbacks_in_executor
+        self.debug_endpoint = debug_endpoint
+        self.debug_token = debug_token
         if webhook_endpoint[0] != "/":
             self.webhook_endpoint = f"/{webhook_endpoint}"
         else:
@@ -58,7 +98,17 @@ class WebhookManager:
             logging.info(f"Webhook is listening at https://{self.host}:{self.port}{self.webhook_endpoint}")
             runner = uvicorn.Server(
                 config=uvicorn.Config(self.app, host=self.host, port=self.port, access_log=False, log_level="error"))
-            await runner.serve()
+            tasks = [asyncio.create_task(self.profiler.monitor_loop_lag())]
+            if self.ledger and self.ledger.reconcile_currency and self.reconcile_interval:
+                tasks.append(asyncio.create_task(
+                    self.ledger.run_reconciliation(self.client, self.reconcile_interval)))
+            if self.backfill:
+                tasks.append(asyncio.create_task(self.backfill.run_periodically(self.backfill_interval)))
+            try:
+                await runner.serve()
+            finally:
+                for task in tasks:
+                    task.cancel()
 
     def successful_handler(self):
         """
@@ -68,6 +118,7 @@ class WebhookManager:
         """
 
         def decorator(func):
+            self._check_callback(func)
             self.successful_callbacks.append(func)
             return func
 
@@ -81,11 +132,142 @@ class WebhookManager:
         """
 
         def decorator(func):
+            self._check_callback(func)
             self.failed_callbacks.append(func)
             return func
 
         return decorator
 
+    def _check_callback(self, func):
+        """
+        Internal method to log and record callbacks that are not coroutine functions.
+
+        :param func: The registered callback.
+        """
+        if not asyncio.iscoroutinefunction(func):
+            name = getattr(func, "__qualname__", repr(func))
+            self.profiler.sync_callbacks.add(name)
+            mode = "runs in a thread pool" if self.run_sync_callbacks_in_executor else "blocks the event loop"
+            logging.info(f"Callback {name} is not a coroutine function and {mode}")
+
+    def enable_backfill(self, checkpoint_path: str = "walletpay_backfill.json", interval: float = 60,
+                        page_size: int = 100, concurrency: int = 5):
+        """
+        Replay events missed while the server was down. The backfill runs when the server starts and then
+        periodically while it is running.
+
+        :param checkpoint_path: Path of the JSON checkpoint file. Default is "walletpay_backfill.json".
+        :param interval: Seconds between order list scans. Default is 60.
+        :param page_size: Number of orders requested per page. Default is 100.
+        :param concurrency: Maximum number of orders replayed at the same time. Default is 5.
+        :return: The WebhookBackfill instance.
+        """
+        from .WebhookBackfill import WebhookBackfill
+        self.backfill = WebhookBackfill(self, checkpoint_path=checkpoint_path, page_size=page_size,
+                                        concurrency=concurrency)
+        self.backfill_interval = interval
+        return self.backfill
+
+    def mark_processed(self, order_id):
+        """
+        Remember that the event of an order was processed.
+
+        :param order_id: Order ID.
+        """
+        self.processed_orders[order_id] = None
+        self.processed_orders.move_to_end(order_id)
+        if len(self.processed_orders) > self.MAX_PROCESSED_ORDERS:
+            self.processed_orders.popitem(last=False)
+
+    def is_processed(self, order_id) -> bool:
+        """
+        Check whether the event of an order was processed.
+
+        :param order_id: Order ID.
+        :return: True if the event was processed.
+        """
+        return order_id in self.processed_orders
+
+    async def dispatch(self, event: Event) -> bool:
+        """
+        Send an event through the ledger and the registered callbacks and mark its order as processed.
+
+        Events are deduplicated by order ID: an event for an order that was already processed is skipped, and while
+        one event of an order is being processed, other events of the same order (e.g. a webhook and its backfilled
+        replay) wait for it and are then skipped. If the callbacks raise, the order is not marked as processed and
+        the next event of the order runs them again.
+
+        :param event: The event to dispatch.
+        :return: True if the event type is known, False otherwise.
+        """
+        if event.type == "ORDER_PAID":
+            callbacks = self.successful_callbacks
+        elif event.type == "ORDER_FAILED":
+            callbacks = self.failed_callbacks
+        else:
+            return False
+
+        order_id = event.payload.order_id
+        # One [lock, number of waiting events] entry per order being processed.
+        entry = self._in_flight.setdefault(order_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if self.is_processed(order_id):
+                    logging.info(f"Skipping event {event.event_id}, order {order_id} was already processed")
+                    return True
+                if self.ledger:
+                    self.ledger.apply(event)
+                for callback in callbacks:
+                    await self._run_callback(callback, event)
+                self.mark_processed(order_id)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._in_flight[order_id]
+        return True
+
+    async def _run_callback(self, callback, event: Event):
+        """
+        Internal method to run a callback under the profiler. Sync callbacks run in a thread pool if
+        run_sync_callbacks_in_executor is set, otherwise on the event loop.
+
+        :param callback: The callback to run.
+        :param event: The event passed to the callback.
+        """
+        name = getattr(callback, "__qualname__", repr(callback))
+        if asyncio.iscoroutinefunction(callback):
+            await self.profiler.measure_coroutine(name, callback(event))
+        elif self.run_sync_callbacks_in_executor:
+            with self.profiler.measure_callback(name, on_loop=False):
+                await asyncio.get_running_loop().run_in_executor(None, callback, event)
+        else:
+            with self.profiler.measure_callback(name, on_loop=True):
+                result = callback(event)
+            if asyncio.iscoroutine(result):
+                await self.profiler.measure_coroutine(name, result)
+
+    def get_stats(self) -> dict:
+        """
+        Get webhook processing statistics.
+
+        :return: Dictionary with percentiles of the read, verify, parse and dispatch stages and of every callback,
+            event loop lag percentiles, sync callbacks and the number of times each callback blocked the loop.
+        """
+        return self.profiler.stats()
+
+    async def _handle_debug(self, request: Request):
+        """
+        Internal method serving webhook processing statistics to requests with the debug token.
+
+        :param request: The incoming request object.
+        :return: The statistics returned by get_stats.
+        """
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {self.debug_token}".encode()):
+            raise HTTPException(status_code=401, detail="Invalid debug token")
+        return self.get_stats()
+
     async def _handle_webhook(self, request: Request):
         """
         Internal method to handle incoming webhooks.
@@ -104,38 +286,38 @@ class WebhookManager:
             logging.info(f'IP {client_ip} not allowed')
             raise HTTPException(status_code=403, detail="IP not allowed")
 
-        data = await request.json()
-        raw_body = await request.body()
+        with self.profiler.measure("read"):
+            raw_body = await request.body()
         headers = request.headers
 
-        signature = headers.get("Walletpay-Signature")
-        timestamp = headers.get("WalletPay-Timestamp")
-        method = request.method
-        path = request.url.path
-        message = f"{method}.{path}.{timestamp}.{base64.b64encode(raw_body).decode()}"
+        with self.profiler.measure("verify"):
+            signature = headers.get("Walletpay-Signature")
+            timestamp = headers.get("WalletPay-Timestamp")
+            method = request.method
+            path = request.url.path
+            message = f"{method}.{path}.{timestamp}.{base64.b64encode(raw_body).decode()}"
 
-        expected_signature = hmac.new(
-            bytes(self.api_key, 'utf-8'),
-            msg=bytes(message, 'utf-8'),
-            digestmod=hmac._hashlib.sha256
-        ).digest()
+            expected_signature = hmac.new(
+                bytes(self.api_key, 'utf-8'),
+                msg=bytes(message, 'utf-8'),
+                digestmod=hmac._hashlib.sha256
+            ).digest()
 
-        expected_signature_b64 = base64.b64encode(expected_signature).decode()
-        if not hmac.compare_digest(expected_signature_b64, signature):
+            expected_signature_b64 = base64.b64encode(expected_signature).decode()
+            valid = hmac.compare_digest(expected_signature_b64, signature)
+        if not valid:
             logging.info(f'Invalid signature. Expected: {expected_signature_b64} Get from header: {signature}')
             raise HTTPException(status_code=400, detail="Invalid signature")
 
-        event = Event(data[0])
+        with self.profiler.measure("parse"):
+            event = Event(json.loads(raw_body)[0])
+        with self.profiler.measure("dispatch"):
+            known = await self.dispatch(event)
+        if not known:
+            return {"message": "Webhook received with unknown status!"}
         if event.type == "ORDER_PAID":
-            for callback in self.successful_callbacks:
-                await callback(event)
             return {"message": "Successful event processed!"}
-        elif event.type == "ORDER_FAILED":
-            for callback in self.failed_callbacks:
-                await callback(event)
-            return {"message": "Failed event processed!"}
-        else:
-            return {"message": "Webhook received with unknown status!"}
+        return {"message": "Failed event processed!"}
 
     def register_webhook_endpoint(self, endpoint: str = '/wp_webhook'):
         """
@@ -144,3 +326,5 @@ class WebhookManager:
         :param endpoint: The endpoint to register. Default is '/wp_webhook'.
         """
         self.app.post(endpoint)(self._handle_webhook)
+        if self.debug_endpoint:
+            self.app.get(self.debug_endpoint)(self._handle_debug)
@@ -0,0 +1,165 @@
+import asyncio
+import time
+import types
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class WebhookProfiler:
+    """
+    Collects timings of webhook processing stages and monitors event loop lag.
+
+    Every stage (read, verify, parse, dispatch and each callback as "callback:<name>") keeps its most recent
+    samples, from which percentiles are computed on read. Sync callbacks and callbacks that block the event loop
+    are tracked separately: a callback is blocking when it runs on the loop for longer than blocking_threshold
+    without yielding. For a sync callback that is its whole duration, for an async callback its longest step
+    between two awaits, so time spent awaiting I/O does not count.
+
+    Attributes:
+        window (int): Number of most recent samples kept per stage.
+        blocking_threshold (float): Duration in seconds above which the event loop counts as blocked.
+        lag_interval (float): Seconds between event loop lag measurements.
+        sync_callbacks (set): Names of registered callbacks that are plain functions.
+        blocking_callbacks (Counter): Number of times each callback blocked the event loop.
+    """
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, window: int = 1000, blocking_threshold: float = 0.05, lag_interval: float = 0.5):
+        """
+        Initialize the WebhookProfiler.
+
+        :param window: Number of most recent samples kept per stage. Default is 1000.
+        :param blocking_threshold: Duration in seconds above which the event loop counts as blocked. Default is 0.05.
+        :param lag_interval: Seconds between event loop lag measurements. Default is 0.5.
+        """
+        self.window = window
+        self.blocking_threshold = blocking_threshold
+        self.lag_interval = lag_interval
+        self.sync_callbacks = set()
+        self.blocking_callbacks = Counter()
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, stage: str, seconds: float):
+        """
+        Record the duration of a stage.
+
+        :param stage: Stage name.
+        :param seconds: Duration in seconds.
+        """
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        Context manager recording the duration of its body as a stage.
+
+        :param stage: Stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def measure_callback(self, name: str, on_loop: bool):
+        """
+        Context manager recording the duration of a callback and detecting whether it blocked the event loop.
+
+        :param name: Callback name.
+        :param on_loop: Whether the callback body runs synchronously on the event loop.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if on_loop and elapsed > self.blocking_threshold:
+                self.blocking_callbacks[name] += 1
+            self.record(f"callback:{name}", elapsed)
+
+    async def measure_coroutine(self, name: str, coro):
+        """
+        Await a callback's coroutine, recording its duration and detecting whether one of its steps blocked the
+        event loop.
+
+        :param name: Callback name.
+        :param coro: The coroutine returned by the callback.
+        :return: The result of the coroutine.
+        """
+        steps = []
+        start = time.perf_counter()
+        try:
+            return await self._timed_steps(coro, steps)
+        finally:
+            if steps and max(steps) > self.blocking_threshold:
+                self.blocking_callbacks[name] += 1
+            self.record(f"callback:{name}", time.perf_counter() - start)
+
+    @staticmethod
+    @types.coroutine
+    def _timed_steps(coro, steps: list):
+        """
+        Internal method to drive a coroutine step by step, appending the time each step runs on the loop to steps.
+        """
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                future = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                steps.append(time.perf_counter() - start)
+            try:
+                value, error = (yield future), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+    def percentiles(self, stage: str) -> Optional[Dict[str, float]]:
+        """
+        Get percentiles of a stage's recent durations.
+
+        :param stage: Stage name.
+        :return: Dictionary with "count", "p50", "p90", "p99" and "max" in seconds, or None if nothing was recorded.
+        """
+        samples = self._samples.get(stage)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        result = {"count": len(ordered), "max": ordered[-1]}
+        for percentile in self.PERCENTILES:
+            result[f"p{percentile}"] = ordered[min(len(ordered) - 1, len(ordered) * percentile // 100)]
+        return result
+
+    def stats(self) -> Dict:
+        """
+        Get all collected statistics.
+
+        :return: Dictionary with stage percentiles, loop lag percentiles, sync callbacks and blocking callbacks.
+        """
+        return {
+            "stages": {stage: self.percentiles(stage) for stage in list(self._samples) if stage != "loop_lag"},
+            "loop_lag": self.percentiles("loop_lag"),
+            "sync_callbacks": sorted(self.sync_callbacks),
+            "blocking_callbacks": dict(self.blocking_callbacks),
+        }
+
+    async def monitor_loop_lag(self):
+        """
+        Measure how late the event loop wakes up from a sleep, until cancelled. The lag is not attributed to
+        callbacks: those in flight may only be awaiting I/O, so blocking callbacks are detected by measure_callback
+        and measure_coroutine instead.
+        """
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.record("loop_lag", max(0.0, time.perf_counter() - start - self.lag_interval))
@@ -1,4 +1,10 @@
 from WalletPay.WalletPayAPI import WalletPayAPI
 from WalletPay.AsyncWalletPayAPI import AsyncWalletPayAPI
 from WalletPay.WebhookManager import WebhookManager
+from WalletPay.OrderExporter import OrderExporter
+from WalletPay.OrderLedger import OrderLedger
+from WalletPay.WebhookBackfill import WebhookBackfill
+from WalletPay.OrderOutbox import OrderOutbox
+from WalletPay.WebhookProfiler import WebhookProfiler
+from WalletPay.OrderListStream import AdaptivePageSizer
 from WalletPay import types
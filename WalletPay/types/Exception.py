@@ -12,6 +12,19 @@ class WalletUnsuccessRequestException(WalletPayException):
         super().__init__(*args, **kwargs)
 
 
+class WalletHTTPStatusException(WalletUnsuccessRequestException):
+    """Raised when the API responds with an HTTP status other than 200."""
+
+    def __init__(self, status_code: int, raw_data, *args, **kwargs):
+        self.status_code = status_code
+        super().__init__(raw_data, *args, **kwargs)
+
+
+class WalletConnectionException(WalletPayException):
+    """Raised when the request did not get a response, e.g. on connection errors and timeouts."""
+    pass
+
+
 class CreateOrderException(WalletUnsuccessRequestException):
     pass
 
@@ -0,0 +1,17 @@
+import asyncio
+from typing import Any, Callable
+
+
+async def call_client(method: Callable, *args, **kwargs) -> Any:
+    """
+    Call a method of either API client from async code.
+
+    Coroutine methods of AsyncWalletPayAPI are awaited directly, blocking methods of WalletPayAPI are run in a
+    worker thread so they do not block the event loop.
+
+    :param method: Bound client method, e.g. client.get_order_amount.
+    :return: The method's return value.
+    """
+    if asyncio.iscoroutinefunction(method):
+        return await method(*args, **kwargs)
+    return await asyncio.to_thread(method, *args, **kwargs)
@@ -4,12 +4,21 @@ setup(
     name='WalletPay',
     version='1.3.1',
     packages=find_packages(),
+    python_requires='>=3.9',
     install_requires=[
         'requests',
         'fastapi',
         'uvicorn',
         'aiohttp',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': [
+            'walletpay-export=WalletPay.OrderExporter:main',
+        ],
+    },
     author='Max Palehin',
     author_email='maksim.wsem@gmail.com',
     url='https://github.com/xdownedx/WalletPay',
@@ -1,6 +1,7 @@
+import asyncio
 import pytest
 from aioresponses import aioresponses
-from WalletPay.types import OrderPreview
+from WalletPay.types import OrderPreview, OrderReconciliationItem
 from WalletPay import AsyncWalletPayAPI
 
 
@@ -69,3 +70,75 @@ async def test_get_order_preview():
         order = await api.get_order_preview(order_id="2703383946854401")
 
         assert isinstance(order, OrderPreview)
+
+
+@pytest.mark.asyncio
+async def test_iter_order_list():
+    item = {
+        "id": 2703383946854401,
+        "status": "PAID",
+        "amount": {"currencyCode": "USD", "amount": "1.00"},
+        "externalId": "ORD-5023-4E89",
+        "createdDateTime": "2019-08-24T14:15:22Z",
+        "expirationDateTime": "2019-08-24T14:15:22Z"
+    }
+    with aioresponses() as mocked:
+        mocked.get('https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-list?offset=0&count=100',
+                   payload={"status": "SUCCESS", "message": "", "data": {"items": [item]}},
+                   status=200)
+
+        api = AsyncWalletPayAPI(api_key="test_key")
+        orders = [order async for order in api.iter_order_list()]
+        await api.close()
+
+        assert len(orders) == 1
+        assert isinstance(orders[0], OrderReconciliationItem)
+
+
+def test_keep_alive_session_lifecycle():
+    url = 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-amount'
+    payload = {"status": "SUCCESS", "message": "", "data": {"totalAmount": 10}}
+
+    async def request(api):
+        assert await api.get_order_amount() == 10
+        return api._session
+
+    with aioresponses() as mocked:
+        mocked.get(url, payload=payload, status=200, repeat=True)
+
+        api = AsyncWalletPayAPI(api_key="test_key")
+        assert asyncio.run(request(api)) is None
+
+        api = AsyncWalletPayAPI(api_key="test_key", keep_alive=True)
+        first = asyncio.run(request(api))
+        second = asyncio.run(request(api))
+        assert first is not second
+        assert first.closed
+        asyncio.run(api.close())
+        assert second.closed
+
+        async def in_context():
+            async with AsyncWalletPayAPI(api_key="test_key") as api:
+                return await request(api)
+
+        assert asyncio.run(in_context()).closed
+
+
+@pytest.mark.asyncio
+async def test_warm_up(local_server):
+    class LocalAsyncWalletPayAPI(AsyncWalletPayAPI):
+        BASE_URL = local_server
+
+    async with LocalAsyncWalletPayAPI(api_key="test_key", pool_size=2) as api:
+        elapsed = await api.warm_up(n_connections=4)
+        connector = api._session.connector
+
+        assert api.warm_up_time == elapsed
+        assert connector._keepalive_timeout == 300
+        assert sum(len(connections) for connections in connector._conns.values()) == 2
+
+    api = LocalAsyncWalletPayAPI(api_key="test_key", pool_size=4, warm_up_connections=3)
+    await asyncio.wait_for(api.warm_up_task, timeout=5)
+    assert api.keep_alive
+    assert sum(len(connections) for connections in api._session.connector._conns.values()) == 3
+    await api.close()
@@ -1,6 +1,6 @@
 import pytest
 import responses
-from WalletPay.types import OrderPreview
+from WalletPay.types import OrderPreview, OrderReconciliationItem
 from WalletPay import WalletPayAPI
 
 
@@ -68,3 +68,58 @@ def test_get_order_preview():
 
         assert isinstance(order, OrderPreview)
 
+
+@pytest.fixture
+def local_api(local_server):
+    class LocalWalletPayAPI(WalletPayAPI):
+        BASE_URL = local_server
+
+    return LocalWalletPayAPI
+
+
+def idle_connections(api):
+    pools = api.session.get_adapter(api.BASE_URL).poolmanager.pools
+    pool = pools[next(iter(pools.keys()))]
+    return pool.num_connections, sum(1 for conn in pool.pool.queue if conn is not None and conn.sock is not None)
+
+
+def test_warm_up(local_api):
+    api = local_api(api_key="test_key", pool_size=2)
+    elapsed = api.warm_up(n_connections=4)
+
+    assert api.warm_up_time == elapsed
+    assert idle_connections(api) == (2, 2)
+
+
+def test_warm_up_in_background(local_api):
+    api = local_api(api_key="test_key", pool_size=4, warm_up_connections=3)
+    assert api.warm_up_thread.is_alive()
+    assert api.warm_up_time is None
+
+    api.warm_up_thread.join(timeout=5)
+    assert api.warm_up_time is not None
+    assert idle_connections(api) == (3, 3)
+
+
+def test_iter_order_list():
+    item = {
+        "id": 2703383946854401,
+        "status": "PAID",
+        "amount": {"currencyCode": "USD", "amount": "1.00"},
+        "externalId": "ORD-5023-4E89",
+        "createdDateTime": "2019-08-24T14:15:22Z",
+        "expirationDateTime": "2019-08-24T14:15:22Z"
+    }
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-list?offset=0&count=2',
+                 json={"status": "SUCCESS", "message": "", "data": {"items": [item, item]}},
+                 status=200)
+        rsps.add(responses.GET, 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-list?offset=2&count=2',
+                 json={"status": "SUCCESS", "message": "", "data": {"items": [item]}},
+                 status=200)
+
+        api = WalletPayAPI(api_key="test_key")
+        orders = list(api.iter_order_list(page_size=2))
+
+        assert len(orders) == 3
+        assert all(isinstance(order, OrderReconciliationItem) for order in orders)
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from decimal import Decimal
+import responses
+from WalletPay import WalletPayAPI, WebhookManager, OrderLedger
+
+
+def make_manager():
+    wm = WebhookManager(client=WalletPayAPI(api_key="test_key"), ledger=OrderLedger())
+    received = []
+
+    @wm.successful_handler()
+    async def handle_successful_event(event):
+        await asyncio.sleep(0.01)
+        received.append(event.event_id)
+
+    return wm, received
+
+
+def test_live_event_after_backfill(make_event):
+    wm, received = make_manager()
+
+    async def deliver():
+        await wm.dispatch(make_event("backfill-7", 7))
+        await wm.dispatch(make_event(555, 7))
+
+    asyncio.run(deliver())
+    assert received == ["backfill-7"]
+    assert wm.ledger.currency_totals("USD")["amount"] == Decimal("1.00")
+
+
+def test_backfill_after_live_event(make_event):
+    wm, received = make_manager()
+
+    async def deliver():
+        await wm.dispatch(make_event(555, 7))
+        await wm.dispatch(make_event("backfill-7", 7))
+        # A replay racing a live delivery of another order waits for it instead of running the callbacks twice.
+        await asyncio.gather(wm.dispatch(make_event(556, 8)), wm.dispatch(make_event("backfill-8", 8)))
+
+    asyncio.run(deliver())
+    assert received == [555, 556]
+    assert wm.ledger.currency_totals("USD")["amount"] == Decimal("2.00")
+    assert not wm._in_flight
+
+
+def test_backfill_replays_missed_events(tmp_path, make_order):
+    checkpoint_path = tmp_path / "backfill.json"
+    checkpoint_path.write_text(json.dumps({"offset": 0, "processed_orders": [1]}))
+
+    wm = WebhookManager(client=WalletPayAPI(api_key="test_key"))
+    received = []
+
+    @wm.successful_handler()
+    async def handle_successful_event(event):
+        received.append(event)
+
+    backfill = wm.enable_backfill(checkpoint_path=str(checkpoint_path), page_size=10)
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET,
+                 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-list?offset=0&count=10',
+                 json={"status": "SUCCESS", "message": "", "data": {"items": [
+                     make_order(1, "PAID"), make_order(2, "PAID"), make_order(3, "ACTIVE")
+                 ]}},
+                 status=200)
+        rsps.add(responses.GET, 'https://pay.wallet.tg/wpay/store-api/v1/order/preview?id=2',
+                 json={"status": "SUCCESS", "message": "", "data": {
+                     "id": 2,
+                     "status": "PAID",
+                     "number": "9aeb581c",
+                     "amount": {"currencyCode": "USD", "amount": "1.00"},
+                     "createdDateTime": "2019-08-24T14:15:22Z",
+                     "expirationDateTime": "2019-08-24T14:15:22Z",
+                     "payLink": "https://t.me/wallet?startattach=wpay_order_2",
+                     "directPayLink": "https://t.me/wallet/start?startapp=wpay_order-orderId__2"
+                 }},
+                 status=200)
+
+        assert asyncio.run(backfill.run()) == 1
+
+    assert [event.payload.order_id for event in received] == [2]
+    assert received[0].payload.selected_payment_option.amountNet.amount == "0.49"
+    assert wm.is_processed(2)
+    assert json.loads(checkpoint_path.read_text())["offset"] == 2
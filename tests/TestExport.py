@@ -0,0 +1,71 @@
+import csv
+import gzip
+import json
+import pytest
+import responses
+from WalletPay import WalletPayAPI, OrderExporter
+from WalletPay.OrderExporter import main
+from WalletPay.types import WalletPayException
+
+
+def add_page(rsps, offset, count, items):
+    rsps.add(responses.GET,
+             f'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-list?offset={offset}&count={count}',
+             json={"status": "SUCCESS", "message": "", "data": {"items": items}},
+             status=200)
+
+
+def test_export_ndjson_gzip(tmp_path, make_order):
+    path = tmp_path / "orders.ndjson.gz"
+    with responses.RequestsMock() as rsps:
+        add_page(rsps, 0, 2, [make_order(), make_order()])
+        add_page(rsps, 2, 2, [make_order()])
+
+        exporter = OrderExporter(WalletPayAPI(api_key="test_key"), page_size=2)
+        total = exporter.export(str(path), fmt="ndjson", compress=True)
+
+    assert total == 3
+    with gzip.open(path, "rt") as file:
+        rows = [json.loads(line) for line in file]
+    assert len(rows) == 3
+    assert rows[0]["fee_amount"] == "0.01"
+    assert rows[0]["net_amount"] == "0.49"
+    assert rows[0]["exchange_rate"] == "2.0"
+
+
+def test_export_csv(tmp_path, make_order):
+    path = tmp_path / "orders.csv"
+    with responses.RequestsMock() as rsps:
+        add_page(rsps, 0, 10, [make_order()])
+
+        exporter = OrderExporter(WalletPayAPI(api_key="test_key"), page_size=10)
+        total = exporter.export(str(path), fmt="csv")
+
+    assert total == 1
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0].keys()) == OrderExporter.COLUMNS
+    assert rows[0]["external_id"] == "ORD-2703383946854401"
+
+
+def test_failed_export_leaves_no_file(tmp_path, make_order):
+    path = tmp_path / "orders.ndjson"
+    with responses.RequestsMock() as rsps:
+        add_page(rsps, 0, 1, [make_order()])
+        rsps.add(responses.GET,
+                 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-list?offset=1&count=1',
+                 json={"message": "Service unavailable"}, status=503)
+
+        exporter = OrderExporter(WalletPayAPI(api_key="test_key"), page_size=1, chunk_size=1)
+        with pytest.raises(WalletPayException):
+            exporter.export(str(path))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cli_rejects_non_positive_sizes(capsys):
+    for option in ("--page-size", "--chunk-size"):
+        with pytest.raises(SystemExit) as error:
+            main(["orders.csv", "--api-key", "test_key", option, "0"])
+        assert error.value.code == 2
+        assert f"{option} must be positive" in capsys.readouterr().err
@@ -0,0 +1,75 @@
+import asyncio
+from decimal import Decimal
+import pytest
+import responses
+from WalletPay import WalletPayAPI, OrderLedger
+from WalletPay.types import WalletPayException
+
+
+def test_apply_events(make_event):
+    ledger = OrderLedger()
+    assert ledger.apply(make_event(1))
+    assert ledger.apply(make_event(2, amount="2.50"))
+    assert not ledger.apply(make_event(2, amount="2.50"))
+    assert ledger.apply(make_event(3, event_type="ORDER_FAILED"))
+    assert ledger.apply(make_event(4, currency="TON"))
+
+    assert ledger.currency_totals("USD")["amount"] == Decimal("3.50")
+    assert ledger.currency_totals("USD")["count"] == 2
+    assert ledger.currency_totals("TON")["amount"] == Decimal("1.00")
+    assert ledger.currency_totals("TON")["net"] == Decimal("1.47")
+    assert ledger.status_totals("EXPIRED", "USD")["count"] == 1
+    assert ledger.bucket_totals("2019-08-24T14:59:59Z", "USD")["amount"] == Decimal("3.50")
+
+
+def test_snapshot_restore_and_reconcile(tmp_path, make_event):
+    ledger = OrderLedger(reconcile_currency="USD")
+    ledger.apply(make_event(1))
+    path = str(tmp_path / "ledger.json")
+    ledger.save(path)
+
+    restored = OrderLedger.load(path)
+    assert restored.currency_totals("USD") == ledger.currency_totals("USD")
+    assert not restored.apply(make_event(1))
+
+    api = WalletPayAPI(api_key="test_key")
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-amount',
+                 json={"status": "SUCCESS", "message": "", "data": {"totalAmount": 10}},
+                 status=200)
+        rsps.add(responses.GET, 'https://pay.wallet.tg/wpay/store-api/v1/reconciliation/order-amount',
+                 json={"status": "SUCCESS", "message": "", "data": {"totalAmount": 15}},
+                 status=200)
+
+        assert asyncio.run(restored.reconcile(api)) is None
+        restored.apply(make_event(2, amount="2.00"))
+        restored.apply(make_event(3, amount="5.00", currency="TON"))
+        assert restored.estimated_order_amount() == Decimal("12.00")
+
+        assert asyncio.run(restored.reconcile(api)) == Decimal("3.00")
+    assert restored.estimated_order_amount() == Decimal("15")
+
+
+def test_reconcile_requires_currency():
+    ledger = OrderLedger()
+    with pytest.raises(WalletPayException):
+        asyncio.run(ledger.reconcile(WalletPayAPI(api_key="test_key")))
+
+
+def test_buckets_keep_most_recent(make_event):
+    ledger = OrderLedger(max_buckets=2)
+    for event_id, completed in ((1, "2024-01-01T10:00:00Z"), (2, "2024-01-01T11:00:00Z"),
+                                (3, "2024-01-01T05:00:00Z"), (4, "2024-01-01T12:00:00Z")):
+        ledger.apply(make_event(event_id, completed=completed))
+
+    assert ledger.bucket_totals("2024-01-01T05:00:00Z", "USD")["count"] == 0
+    assert ledger.bucket_totals("2024-01-01T10:00:00Z", "USD")["count"] == 0
+    assert ledger.bucket_totals("2024-01-01T11:00:00Z", "USD")["count"] == 1
+    assert ledger.bucket_totals("2024-01-01T12:00:00Z", "USD")["count"] == 1
+    assert ledger.currency_totals("USD")["count"] == 4
+
+    snapshot = ledger.snapshot()
+    restored = OrderLedger(max_buckets=1)
+    restored.restore(snapshot)
+    assert restored.bucket_totals("2024-01-01T11:00:00Z", "USD")["count"] == 0
+    assert restored.bucket_totals("2024-01-01T12:00:00Z", "USD")["count"] == 1
@@ -0,0 +1,45 @@
+import json
+import pytest
+from WalletPay.OrderListStream import OrderItemsParser, AdaptivePageSizer
+from WalletPay.types import WalletPayException
+
+
+def test_parser_yields_items_across_chunks():
+    items = [{"id": i, "externalId": 'ORD-"{[]}"\\-\u00e9', "amount": {"currencyCode": "USD", "amount": "1.00"}}
+             for i in range(20)]
+    body = json.dumps({"status": "SUCCESS", "message": "", "data": {"items": items}}, ensure_ascii=False).encode()
+
+    for chunk_size in (1, 3, 64, len(body)):
+        parser = OrderItemsParser()
+        parsed = []
+        for start in range(0, len(body), chunk_size):
+            parsed += parser.feed(body[start:start + chunk_size])
+        assert parser.close() == "SUCCESS"
+        assert parsed == items
+
+
+def test_parser_handles_whitespace_and_trailing_fields():
+    items = [{"id": i, "tags": [], "note": "] , }"} for i in range(5)]
+    body = json.dumps({"data": {"items": items, "total": 5}, "message": "ok", "status": "SUCCESS"}, indent=2).encode()
+
+    for chunk_size in (1, 7, len(body)):
+        parser = OrderItemsParser()
+        parsed = []
+        for start in range(0, len(body), chunk_size):
+            parsed += parser.feed(body[start:start + chunk_size])
+        assert parser.close() == "SUCCESS"
+        assert parser.message == "ok"
+        assert parsed == items
+
+
+def test_parser_rejects_truncated_response():
+    parser = OrderItemsParser()
+    parser.feed(b'{"status": "SUCCESS", "data": {"items": [{"id": 1}, {"id"')
+    with pytest.raises(WalletPayException):
+        parser.close()
+
+
+def test_sizer_moves_toward_target():
+    sizer = AdaptivePageSizer(initial=100, target_latency=1.0, target_bytes=10 ** 9, smoothing=1.0)
+    assert sizer.observe(received=100, latency=0.25, size=1000) == 400
+    assert sizer.observe(received=400, latency=2.0, size=4000) == 200
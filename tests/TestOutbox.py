@@ -0,0 +1,156 @@
+import asyncio
+import gc
+import socket
+import time
+import requests
+import responses
+from WalletPay import WalletPayAPI, OrderOutbox
+from WalletPay.types import OrderPreview
+from WalletPay.types.Exception import WalletHTTPStatusException
+
+
+ORDER_RESPONSE = {
+    "status": "SUCCESS",
+    "message": "",
+    "data": {
+        "id": 2703383946854401,
+        "status": "ACTIVE",
+        "number": "9aeb581c",
+        "amount": {
+            "currencyCode": "USD",
+            "amount": "1.00"
+        },
+        "createdDateTime": "2019-08-24T14:15:22Z",
+        "expirationDateTime": "2019-08-24T14:15:22Z",
+        "payLink": "https://t.me/wallet?startattach=wpay_order_2703383946854401",
+        "directPayLink": "https://t.me/wallet/start?startapp=wpay_order-orderId__2703383946854401"
+    }
+}
+
+
+def submit_order(outbox):
+    return outbox.submit(
+        amount=1.0,
+        currency_code="USD",
+        description="VPN for 1 month",
+        external_id="ORD-5023-4E89",
+        timeout_seconds=10800,
+        customer_telegram_user_id="0"
+    )
+
+
+def test_outbox_retries_and_survives_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+
+    async def enqueue():
+        outbox = OrderOutbox(WalletPayAPI(api_key="test_key"), path=path)
+        submit_order(outbox)
+        assert outbox.metrics()["depth"] == 1
+        outbox.close()
+
+    async def drain():
+        delivered = []
+        outbox = OrderOutbox(WalletPayAPI(api_key="test_key"), path=path, backoff=0.01,
+                             on_success=delivered.append)
+        future = submit_order(outbox)
+        await outbox.start()
+        order = await asyncio.wait_for(future, timeout=5)
+        await outbox.stop()
+
+        assert isinstance(order, OrderPreview)
+        assert delivered == [order]
+        assert outbox.metrics()["depth"] == 0
+
+        duplicate = await submit_order(outbox)
+        assert duplicate.id == order.id
+        outbox.close()
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.POST, 'https://pay.wallet.tg/wpay/store-api/v1/order',
+                 json={"message": "Service unavailable"}, status=503)
+        rsps.add(responses.POST, 'https://pay.wallet.tg/wpay/store-api/v1/order',
+                 json=ORDER_RESPONSE, status=200)
+
+        asyncio.run(enqueue())
+        asyncio.run(drain())
+
+
+def test_outbox_does_not_retry_rejected_orders(tmp_path):
+    async def run():
+        failures, loop_errors = [], []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+        outbox = OrderOutbox(WalletPayAPI(api_key="test_key"), path=str(tmp_path / "outbox.db"), backoff=0.01,
+                             on_failure=lambda external_id, e: failures.append((external_id, type(e), e.status_code)))
+        submit_order(outbox)
+        await outbox.start()
+        while not failures:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        outbox.close()
+        gc.collect()
+        return failures, loop_errors
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.POST, 'https://pay.wallet.tg/wpay/store-api/v1/order',
+                 json={"message": "Invalid amount"}, status=400)
+
+        failures, loop_errors = asyncio.run(run())
+        assert len(rsps.calls) == 1
+
+    assert failures == [("ORD-5023-4E89", WalletHTTPStatusException, 400)]
+    assert not loop_errors
+
+
+def test_outbox_times_out_hung_attempts(tmp_path):
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    class HungWalletPayAPI(WalletPayAPI):
+        BASE_URL = f"http://127.0.0.1:{server.getsockname()[1]}/wpay/store-api/v1/"
+
+    async def run():
+        failures = []
+        outbox = OrderOutbox(HungWalletPayAPI(api_key="test_key"), path=str(tmp_path / "outbox.db"), concurrency=1,
+                             max_attempts=2, backoff=0.01, attempt_timeout=0.2,
+                             on_failure=lambda external_id, e: failures.append(external_id))
+        submit_order(outbox)
+        await outbox.start()
+        start = time.monotonic()
+        while not failures:
+            assert time.monotonic() - start < 5
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        outbox.close()
+        return failures
+
+    try:
+        assert asyncio.run(run()) == ["ORD-5023-4E89"]
+    finally:
+        server.close()
+
+
+def test_outbox_retry_after_lost_response_succeeds(tmp_path):
+    async def run():
+        delivered = []
+        outbox = OrderOutbox(WalletPayAPI(api_key="test_key"), path=str(tmp_path / "outbox.db"), backoff=0.01,
+                             on_success=delivered.append, on_failure=lambda external_id, e: None)
+        future = submit_order(outbox)
+        await outbox.start()
+        order = await asyncio.wait_for(future, timeout=5)
+        await outbox.stop()
+        outbox.close()
+        return order, delivered
+
+    with responses.RequestsMock() as rsps:
+        # The first attempt creates the order but its response is lost, the retry finds the existing order.
+        rsps.add(responses.POST, 'https://pay.wallet.tg/wpay/store-api/v1/order',
+                 body=requests.exceptions.ReadTimeout("Read timed out"))
+        rsps.add(responses.POST, 'https://pay.wallet.tg/wpay/store-api/v1/order',
+                 json={**ORDER_RESPONSE, "status": "ALREADY"}, status=200)
+
+        order, delivered = asyncio.run(run())
+        assert len(rsps.calls) == 2
+
+    assert order.id == 2703383946854401
+    assert delivered == [order]
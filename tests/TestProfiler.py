@@ -0,0 +1,93 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException, Request
+from WalletPay import WalletPayAPI, WebhookManager, WebhookProfiler
+from WalletPay.types import WalletPayException
+
+
+def test_callback_profiling(make_event):
+    wm = WebhookManager(client=WalletPayAPI(api_key="test_key"),
+                        profiler=WebhookProfiler(blocking_threshold=0.01))
+    received = []
+
+    @wm.successful_handler()
+    async def handle_async(event):
+        received.append(event)
+
+    @wm.successful_handler()
+    def handle_blocking(event):
+        time.sleep(0.02)
+
+    asyncio.run(wm.dispatch(make_event(1)))
+
+    stats = wm.get_stats()
+    assert len(received) == 1
+    assert stats["sync_callbacks"] == ["test_callback_profiling.<locals>.handle_blocking"]
+    assert stats["blocking_callbacks"] == {"test_callback_profiling.<locals>.handle_blocking": 1}
+    assert stats["stages"]["callback:test_callback_profiling.<locals>.handle_async"]["count"] == 1
+
+
+def test_sync_callbacks_in_executor(make_event):
+    wm = WebhookManager(client=WalletPayAPI(api_key="test_key"), run_sync_callbacks_in_executor=True,
+                        profiler=WebhookProfiler(blocking_threshold=0.01))
+
+    @wm.successful_handler()
+    def handle_blocking(event):
+        time.sleep(0.02)
+
+    asyncio.run(wm.dispatch(make_event(1)))
+
+    stats = wm.get_stats()
+    assert stats["blocking_callbacks"] == {}
+    assert stats["stages"]["callback:test_sync_callbacks_in_executor.<locals>.handle_blocking"]["p50"] >= 0.02
+
+
+def test_concurrent_callbacks_blame_only_loop_time(make_event):
+    wm = WebhookManager(client=WalletPayAPI(api_key="test_key"),
+                        profiler=WebhookProfiler(blocking_threshold=0.05, lag_interval=0.01))
+
+    @wm.successful_handler()
+    async def innocent_io(event):
+        await asyncio.sleep(0.3)
+
+    @wm.successful_handler()
+    async def blocking_step(event):
+        await asyncio.sleep(0)
+        time.sleep(0.1)
+
+    @wm.failed_handler()
+    def blocking(event):
+        time.sleep(0.1)
+
+    async def main():
+        monitor = asyncio.create_task(wm.profiler.monitor_loop_lag())
+        await asyncio.sleep(0.02)
+        await asyncio.gather(wm.dispatch(make_event(1)), wm.dispatch(make_event(2, event_type="ORDER_FAILED")))
+        monitor.cancel()
+
+    asyncio.run(main())
+
+    stats = wm.get_stats()
+    prefix = "test_concurrent_callbacks_blame_only_loop_time.<locals>."
+    assert stats["loop_lag"]["max"] >= 0.05
+    assert stats["blocking_callbacks"] == {f"{prefix}blocking": 1, f"{prefix}blocking_step": 1}
+    assert stats["stages"][f"callback:{prefix}innocent_io"]["max"] >= 0.3
+
+
+def test_debug_endpoint_requires_token():
+    with pytest.raises(WalletPayException):
+        WebhookManager(client=WalletPayAPI(api_key="test_key"), debug_endpoint="/wp_debug")
+
+    wm = WebhookManager(client=WalletPayAPI(api_key="test_key"), debug_endpoint="/wp_debug", debug_token="secret")
+
+    def request(authorization=None):
+        headers = [(b"authorization", authorization.encode())] if authorization else []
+        return Request({"type": "http", "method": "GET", "path": "/wp_debug", "headers": headers,
+                        "client": ("127.0.0.1", 80)})
+
+    for authorization in (None, "Bearer wrong"):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(wm._handle_debug(request(authorization)))
+        assert error.value.status_code == 401
+    assert "stages" in asyncio.run(wm._handle_debug(request("Bearer secret")))
@@ -0,0 +1,83 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from WalletPay.types import Event
+
+
+@pytest.fixture
+def payment_option():
+    return {
+        "amount": {"currencyCode": "TON", "amount": "0.50"},
+        "amountFee": {"currencyCode": "TON", "amount": "0.01"},
+        "amountNet": {"currencyCode": "TON", "amount": "0.49"},
+        "exchangeRate": "2.0"
+    }
+
+
+@pytest.fixture
+def make_order(payment_option):
+    def make(order_id=2703383946854401, status="PAID"):
+        order = {
+            "id": order_id,
+            "status": status,
+            "amount": {"currencyCode": "USD", "amount": "1.00"},
+            "externalId": f"ORD-{order_id}",
+            "customerTelegramUserId": 0,
+            "createdDateTime": "2019-08-24T14:15:22Z",
+            "expirationDateTime": "2019-08-24T14:15:22Z"
+        }
+        if status == "PAID":
+            order["paymentDateTime"] = "2019-08-24T14:15:22Z"
+            order["selectedPaymentOption"] = payment_option
+        return order
+
+    return make
+
+
+@pytest.fixture
+def make_event(payment_option):
+    def make(event_id, order_id=None, event_type="ORDER_PAID", amount="1.00", currency="USD",
+             completed="2019-08-24T14:15:22Z"):
+        order_id = event_id if order_id is None else order_id
+        payload = {
+            "id": order_id,
+            "number": "9aeb581c",
+            "externalId": f"ORD-{order_id}",
+            "orderAmount": {"currencyCode": currency, "amount": amount},
+            "orderCompletedDateTime": completed
+        }
+        if event_type == "ORDER_PAID":
+            payload["selectedPaymentOption"] = payment_option
+        else:
+            payload["status"] = "EXPIRED"
+        return Event({
+            "eventId": event_id,
+            "eventDateTime": "2019-08-24T14:15:22Z",
+            "type": event_type,
+            "payload": payload
+        })
+
+    return make
+
+
+class SlowHeadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        time.sleep(0.1)
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHeadHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/wpay/store-api/v1/"
+    server.shutdown()
+    server.server_close()